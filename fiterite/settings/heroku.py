@@ -10,12 +10,28 @@ DEBUG = False
 # Honor the 'X-Forwarded-Proto' header for request.is_secure()
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# The Heroku router appends the connecting address to X-Forwarded-For
+CLIENT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+
 ALLOWED_HOSTS = ['*']
 
 DATABASES = {
     'default': dj_database_url.config()
 }
 
+# Join throttles and tokens, feed pages and profiles are shared by every web and worker process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+        'LOCATION': os.environ['MEMCACHIER_SERVERS'].split(','),
+        'OPTIONS': {
+            'binary': True,
+            'username': os.environ['MEMCACHIER_USERNAME'],
+            'password': os.environ['MEMCACHIER_PASSWORD'],
+        },
+    }
+}
+
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 AWS_STORAGE_BUCKET_NAME = os.environ['AWS_STORAGE_BUCKET_NAME']
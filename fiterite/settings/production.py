@@ -11,6 +11,14 @@ SESSION_COOKIE_SECURE = True
 
 ALLOWED_HOSTS = []
 
+# Join throttles and tokens, feed pages and profiles are shared by every web and worker process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+        'LOCATION': os.environ['MEMCACHE_SERVERS'].split(','),
+    }
+}
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
@@ -1,7 +1,63 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import League, Army, Battle
 
-admin.site.register(League)
-admin.site.register(Army)
-admin.site.register(Battle)
+
+class EstimatedCountPaginator(Paginator):
+    """ Use the planner's row estimate for unfiltered changelists of big tables instead of counting every row """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > self.threshold:
+                return int(row[0])
+        return super().count
+
+
+class UnfilteredAdmin(admin.ModelAdmin):
+    """ Show rows of soft-deleted leagues too, and skip the second full count on filtered changelists """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
+@admin.register(League)
+class LeagueAdmin(UnfilteredAdmin):
+    list_display = ('title', 'owner', 'current_points', 'deleted_at')
+    list_select_related = ('owner',)
+    list_filter = ('deleted_at',)
+    search_fields = ('=id', 'title__startswith')
+    autocomplete_fields = ('owner',)
+
+
+@admin.register(Army)
+class ArmyAdmin(UnfilteredAdmin):
+    list_display = ('title', 'user', 'league', 'allegiance', 'active')
+    list_select_related = ('user', 'league')
+    list_filter = ('active', 'allegiance')
+    search_fields = ('=id', 'title__startswith')
+    autocomplete_fields = ('user', 'league')
+
+
+@admin.register(Battle)
+class BattleAdmin(UnfilteredAdmin):
+    list_display = ('id', 'date', 'league', 'army1', 'army1_pts', 'army2', 'army2_pts')
+    list_select_related = ('league', 'army1', 'army2')
+    list_filter = ('date',)
+    search_fields = ('=id',)
+    autocomplete_fields = ('league', 'army1', 'army2')
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """ Join throttles, feed pages and captured profiles only work across processes with a shared cache """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL:
+        return []
+    return [Warning(
+        "The default cache is local to each process.",
+        hint="Set CACHES to a cache every web and worker process shares, such as memcached, "
+             "so join throttles, feed pages and staff profiles are seen by all of them.",
+        id='home.W001',
+    )]
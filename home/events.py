@@ -0,0 +1,72 @@
+import json
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_date
+
+from .models import League, BattleEvent
+
+CHUNK_SIZE = 1000
+
+
+def encode(row):
+    if row is None:
+        return ''
+    day, army1_id, army2_id, army1_pts, army2_pts = row
+    return json.dumps([day.isoformat(), army1_id, army2_id, army1_pts, army2_pts])
+
+
+def decode(text):
+    """ The (date, army1 id, army2 id, army1 pts, army2 pts) row stored in an event, or None """
+    if not text:
+        return None
+    day, army1_id, army2_id, army1_pts, army2_pts = json.loads(text)
+    return parse_date(day), army1_id, army2_id, army1_pts, army2_pts
+
+
+def rows(event):
+    return decode(event.before), decode(event.after)
+
+
+def record(league_id, battle_id, kind, before, after, actor=None):
+    """ Append an event, numbered after the league's last one while holding a lock on the league row """
+    with transaction.atomic():
+        League.all_objects.select_for_update().filter(pk=league_id).values_list('pk').first()
+        last = BattleEvent.objects.filter(league_id=league_id).aggregate(last=Max('seq'))['last'] or 0
+        return BattleEvent.objects.create(league_id=league_id, seq=last + 1, battle_id=battle_id, kind=kind,
+                                          before=encode(before), after=encode(after), actor=actor)
+
+
+def chunks(league_id, after_seq=0, until_seq=None, chunk_size=CHUNK_SIZE):
+    """ The league's events after ``after_seq`` in order, as lists of at most chunk_size, walking the sequence """
+    events = BattleEvent.objects.filter(league_id=league_id).order_by('seq')
+    if until_seq is not None:
+        events = events.filter(seq__lte=until_seq)
+    while True:
+        chunk = list(events.filter(seq__gt=after_seq)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after_seq = chunk[-1].seq
+
+
+def standing(league_id, after_seq=0, until_seq=None, chunk_size=CHUNK_SIZE):
+    """
+    (seq, row) of the battles first reported after ``after_seq`` that still stand once the log is replayed up to
+    ``until_seq``, in the order they were reported, with each row as last edited.
+    """
+    standing = {}
+    for chunk in chunks(league_id, after_seq, until_seq, chunk_size):
+        for event in chunk:
+            if event.kind == BattleEvent.Kind.CREATED:
+                standing[event.battle_id] = (event.seq, decode(event.after))
+            elif event.kind == BattleEvent.Kind.UPDATED and event.battle_id in standing:
+                standing[event.battle_id] = (standing[event.battle_id][0], decode(event.after))
+            else:
+                standing.pop(event.battle_id, None)
+    return sorted(standing.values(), key=lambda item: item[0])
+
+
+def battles(league_id, until_seq=None, chunk_size=CHUNK_SIZE):
+    """ Rows of the battles standing after replaying the log, in the order they were first reported """
+    return [row for _, row in standing(league_id, until_seq=until_seq, chunk_size=chunk_size)]
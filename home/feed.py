@@ -0,0 +1,89 @@
+from heapq import merge
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import Army, Battle
+
+PAGE_SIZE = 25
+TIMEOUT = 5 * 60
+
+
+def _key(user_id):
+    return 'battle-feed:{}'.format(user_id)
+
+
+def _newest(side, army_id, after, limit):
+    """
+    (date, id) of an army's newest battles on one side after the cursor. Filtering on a single army keeps the
+    query a range scan of that side's (army, -date, -id) index that stops after limit rows.
+    """
+    battles = Battle.all_objects.filter(**{side: army_id})
+    if after is not None:
+        day, pk = after
+        battles = battles.filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+    return list(battles.order_by('-date', '-pk').values_list('date', 'pk')[:limit])
+
+
+def _merged(streams, limit):
+    """ Newest first union of several newest-first (date, id) lists, a battle between two of them counted once """
+    keys = []
+    for key in merge(*streams, reverse=True):
+        if not keys or keys[-1] != key:
+            keys.append(key)
+        if len(keys) == limit:
+            break
+    return keys
+
+
+def cursor(battle):
+    return '{}.{}'.format(battle.date.isoformat(), battle.pk)
+
+
+def parse_cursor(text):
+    """ (date, id) of the last battle on the previous page, None for the first page or a malformed cursor """
+    day, _, pk = (text or '').partition('.')
+    try:
+        day = parse_date(day)
+    except ValueError:
+        return None
+    if day is None or not pk.isdigit():
+        return None
+    return day, int(pk)
+
+
+def page(user, after=None, size=PAGE_SIZE):
+    """
+    The user's battles from newest to oldest following the ``after`` (date, id) position, and the cursor of the
+    next page or None. Pages are walked by key rather than offset, the first one is cached until the user's next write.
+    """
+    if after is None:
+        cached = cache.get(_key(user.pk))
+        if cached is not None:
+            return cached
+    army_ids = Army.objects.filter(user=user).values_list('pk', flat=True)
+    keys = _merged([_newest(side, army_id, after, size + 1) for army_id in army_ids for side in ('army1', 'army2')],
+                   size + 1)
+    found = Battle.all_objects.select_related('league', 'army1__user', 'army2__user').in_bulk([pk for _, pk in keys])
+    rows = [found[pk] for _, pk in keys if pk in found]
+    result = rows[:size], cursor(rows[size - 1]) if len(rows) > size else None
+    if after is None:
+        cache.set(_key(user.pk), result, TIMEOUT)
+    return result
+
+
+def forget_users(user_ids):
+    """
+    Drop the users' cached first pages now and again once the surrounding transaction commits, a page read
+    in between still sees the rows from before the write and would otherwise stay cached for the full timeout
+    """
+    keys = [_key(user_id) for user_id in set(user_ids) - {None}]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_armies(army_ids):
+    """ Drop the cached first page of every player owning one of the armies """
+    forget_users(Army.all_objects.filter(pk__in=set(army_ids) - {None}).values_list('user_id', flat=True))
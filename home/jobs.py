@@ -0,0 +1,118 @@
+import json
+import logging
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+BACKOFF = timedelta(seconds=30)
+LEASE = timedelta(minutes=10)
+
+_handlers = {}
+
+
+def job(name, batch=False, merge=False):
+    """
+    Register a job handler. A plain handler is called with the payload as keyword arguments, a batch handler
+    gets every due payload of its job in one call and returns a list holding an error or None for each.
+    A merge handler is called once per distinct payload claimed together, every copy sharing that outcome.
+    """
+    def register(func):
+        _handlers[name] = (func, batch, merge)
+        return func
+    return register
+
+
+def enqueue(name, max_attempts=5, run_at=None, **payload):
+    """ Queue a job, it commits or rolls back together with the surrounding transaction """
+    return Job.objects.create(name=name, payload=json.dumps(payload), max_attempts=max_attempts,
+                              run_at=run_at or timezone.now())
+
+
+def claim(batch_size=BATCH_SIZE):
+    """
+    Lease up to batch_size due jobs, including running ones whose worker let the lease lapse. A job whose lease
+    lapsed on its last attempt most likely takes its worker down with it, so it is failed instead.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Job.objects.filter(status=Job.Status.RUNNING, run_at__lte=now, attempts__gte=F('max_attempts')) \
+            .update(status=Job.Status.FAILED, last_error="Lease lapsed on the last attempt")
+        due = Job.objects.select_for_update(skip_locked=True) \
+            .filter(status__in=[Job.Status.PENDING, Job.Status.RUNNING], run_at__lte=now).order_by('run_at')
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        Job.objects.filter(pk__in=ids).update(status=Job.Status.RUNNING, run_at=now + LEASE,
+                                              attempts=F('attempts') + 1)
+    return list(Job.objects.filter(pk__in=ids))
+
+
+def _finish(job, error):
+    if error is None:
+        job.delete()
+        return
+    logger.warning("Job %s failed on attempt %s: %s", job, job.attempts, error)
+    job.last_error = error
+    if job.attempts >= job.max_attempts:
+        job.status = Job.Status.FAILED
+    else:
+        job.status = Job.Status.PENDING
+        job.run_at = timezone.now() + BACKOFF * 2 ** (job.attempts - 1)
+    job.save(update_fields=['status', 'run_at', 'last_error'])
+
+
+def _format(exc):
+    return ''.join(traceback.format_exception_only(type(exc), exc)).strip()
+
+
+def run_pending(batch_size=BATCH_SIZE):
+    """ Run one batch of due jobs, returns how many were claimed """
+    claimed = claim(batch_size)
+    by_name = defaultdict(list)
+    for job in claimed:
+        by_name[job.name].append(job)
+    for name, batch in by_name.items():
+        if name not in _handlers:
+            for job in batch:
+                _finish(job, "No handler registered for {}".format(name))
+            continue
+        handler, batched, merged = _handlers[name]
+        payloads = [json.loads(job.payload) for job in batch]
+        if batched:
+            try:
+                errors = handler(payloads)
+            except Exception as exc:
+                errors = [_format(exc)] * len(batch)
+            for job, error in zip(batch, errors):
+                _finish(job, error and str(error))
+            continue
+        outcomes = {}
+        for job, payload in zip(batch, payloads):
+            if merged and job.payload in outcomes:
+                _finish(job, outcomes[job.payload])
+                continue
+            try:
+                handler(**payload)
+            except Exception as exc:
+                outcomes[job.payload] = _format(exc)
+            else:
+                outcomes[job.payload] = None
+            _finish(job, outcomes[job.payload])
+    return len(claimed)
+
+
+def drain(batch_size=BATCH_SIZE):
+    """ Stand-in worker for tests and scripts, runs due jobs in process until none are left """
+    total = 0
+    while True:
+        ran = run_pending(batch_size)
+        if not ran:
+            return total
+        total += ran
@@ -0,0 +1,89 @@
+import base64
+from email.mime.base import MIMEBase
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+
+from . import jobs
+
+
+def serialize(message):
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'content_subtype': message.content_subtype,
+        'alternatives': getattr(message, 'alternatives', []),
+        'attachments': [(name, base64.b64encode(content if isinstance(content, bytes) else content.encode()).decode(),
+                         mimetype) for name, content, mimetype in message.attachments],
+    }
+
+
+def deserialize(data, connection=None):
+    message = EmailMultiAlternatives(
+        subject=data['subject'], body=data['body'], from_email=data['from_email'], to=data['to'], cc=data['cc'],
+        bcc=data['bcc'], reply_to=data['reply_to'], headers=data['headers'], connection=connection,
+        alternatives=[tuple(alternative) for alternative in data['alternatives']])
+    message.content_subtype = data['content_subtype']
+    for name, content, mimetype in data['attachments']:
+        message.attach(name, base64.b64decode(content), mimetype)
+    return message
+
+
+def delivery_connection(fail_silently=False):
+    """ Connection to the backend that really sends mail, bypassing the queue """
+    return get_connection(settings.QUEUED_EMAIL_BACKEND, fail_silently=fail_silently)
+
+
+def queueable(message):
+    """ Prebuilt MIME attachments cannot be stored in a job payload """
+    return not any(isinstance(attachment, MIMEBase) for attachment in message.attachments)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend that queues each message for the run_jobs worker instead of talking to the mail server.
+    Messages carrying prebuilt MIME attachments are sent straight away instead.
+    """
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            try:
+                if queueable(message):
+                    with transaction.atomic():
+                        jobs.enqueue('send_email', message=serialize(message))
+                    sent += 1
+                else:
+                    sent += delivery_connection(self.fail_silently).send_messages([message]) or 0
+            except Exception:
+                if not self.fail_silently:
+                    raise
+        return sent
+
+
+@jobs.job('send_email', batch=True)
+def send_email(payloads):
+    """ Deliver a batch of queued messages over a single connection """
+    errors = []
+    with delivery_connection() as connection:
+        for payload in payloads:
+            try:
+                deserialize(payload['message'], connection).send()
+            except Exception as exc:
+                errors.append(str(exc) or exc.__class__.__name__)
+            else:
+                errors.append(None)
+    return errors
+
+
+def send(subject, body, to):
+    """ Queue a plain text message from the default sender """
+    jobs.enqueue('send_email', message=serialize(EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, to)))
@@ -0,0 +1,44 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+from random import Random
+
+from django.contrib.auth.models import User
+
+from home.models import League, Army, Battle
+
+
+class Rollback(Exception):
+    """ Raised inside transaction.atomic() to throw away benchmark data """
+
+
+def measure(func):
+    """ Wall time and peak traced memory of calling func """
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def build_league(armies, battles, seed=0):
+    """ League with the given number of armies and randomly paired battles, inserted in bulk without signals """
+    rng = Random(seed)
+    stamp = int(time.monotonic() * 1000000)
+    owner = User.objects.create_user('bench-owner-{}'.format(stamp))
+    league = League.objects.create(title='Bench', description='Bench', image='league/bench.png', owner=owner)
+    User.objects.bulk_create(User(username='bench-{}-{}'.format(stamp, i)) for i in range(armies))
+    users = User.objects.filter(username__startswith='bench-{}-'.format(stamp))
+    Army.objects.bulk_create(Army(title='Army {}'.format(i), image='', league=league, user=user)
+                             for i, user in enumerate(users))
+    army_ids = list(Army.objects.filter(league=league).values_list('pk', flat=True))
+    start = date(2020, 1, 1)
+    Battle.objects.bulk_create((Battle(league=league,
+                                       army1_id=rng.choice(army_ids),
+                                       army2_id=rng.choice(army_ids),
+                                       date=start + timedelta(days=rng.randrange(365)),
+                                       army1_pts=rng.randrange(20),
+                                       army2_pts=rng.randrange(20)) for _ in range(battles)), batch_size=500)
+    return league
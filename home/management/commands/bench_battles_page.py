@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.shortcuts import render
+from django.test import RequestFactory
+
+from home import views
+from home.middleware import CompressionMiddleware, brotli
+from home.models import Battle
+from home.tables import BattleTable
+from ._fixtures import Rollback, build_league
+
+
+def buffered_battles(request, league_id):
+    """ The battle list as it was rendered before streaming """
+    battle_table = BattleTable(Battle.objects.filter(league_id=league_id).order_by('-date')
+                               .select_related('army1__user', 'army2__user'))
+    return render(request, 'home/battles.html', {'battle_table': battle_table})
+
+
+class Command(BaseCommand):
+    help = "Report bytes on the wire and time to first byte of a large league's battle list"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--battles', type=int, default=5000)
+        parser.add_argument('--armies', type=int, default=100)
+
+    def fetch(self, view, request):
+        started = time.perf_counter()
+        response = CompressionMiddleware(view)(request)
+        if response.streaming:
+            chunks = iter(response.streaming_content)
+            first = next(chunks)
+            first_byte = time.perf_counter() - started
+            size = len(first) + sum(len(chunk) for chunk in chunks)
+        else:
+            first_byte = time.perf_counter() - started
+            size = len(response.content)
+        return first_byte, time.perf_counter() - started, size, response.get('Content-Encoding', 'identity')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        self.stdout.write("{:<10} {:<9} {:>10} {:>10} {:>12}".format('page', 'encoding', 'ttfb ms', 'total ms', 'bytes'))
+        try:
+            with transaction.atomic():
+                league = build_league(options['armies'], options['battles'])
+                user = league.army_set.first().user
+                for label, view in (('streamed', views.battles), ('buffered', buffered_battles)):
+                    for encoding in ['identity', 'gzip'] + (['br'] if brotli else []):
+                        request = factory.get('/{}/battles'.format(league.id), HTTP_ACCEPT_ENCODING=encoding)
+                        request.user = user
+                        first_byte, total, size, used = self.fetch(lambda r: view(r, league.id), request)
+                        self.stdout.write("{:<10} {:<9} {:>10.1f} {:>10.1f} {:>12,}".format(
+                            label, used, first_byte * 1000, total * 1000, size))
+                raise Rollback
+        except Rollback:
+            pass
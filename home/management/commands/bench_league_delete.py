@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from home import purge, views
+from ._fixtures import Rollback, build_league, measure
+
+
+class Command(BaseCommand):
+    help = "Compare request latency and peak memory of deleting a large league, inside a rolled back transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--battles', type=int, default=50000)
+        parser.add_argument('--armies', type=int, default=200)
+        parser.add_argument('--skip-cascade', action='store_true', help="Don't time the old synchronous delete")
+
+    def run(self, label, armies, battles, func):
+        try:
+            with transaction.atomic():
+                league = build_league(armies, battles, seed=armies)
+                elapsed, peak = measure(lambda: func(league))
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write("{:<32} {:>9.3f} s {:>10.1f} MiB".format(label, elapsed, peak / 2 ** 20))
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+
+        def soft_delete_request(league):
+            request = factory.get('/delete/{}'.format(league.id))
+            request.user = league.owner
+            views.delete(request, league.id)
+
+        def purge_task(league):
+            purge.soft_delete(league)
+            purge.purge_league(league.id)
+
+        if not options['skip_cascade']:
+            self.run('cascade delete (old request)', options['armies'], options['battles'],
+                     lambda league: league.delete())
+        self.run('soft delete (new request)', options['armies'], options['battles'], soft_delete_request)
+        self.run('chunked purge (background)', options['armies'], options['battles'], purge_task)
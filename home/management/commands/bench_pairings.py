@@ -0,0 +1,47 @@
+import time
+from collections import Counter
+from random import Random
+
+from django.core.management.base import BaseCommand
+
+from home import pairings
+
+
+def synthetic_league(armies, rounds, rng):
+    """ Standings and head to head history of a league that has already played some Swiss rounds """
+    points = {army_id: 0 for army_id in range(armies)}
+    played = Counter()
+    for _ in range(rounds):
+        standings = sorted(points.items(), key=lambda item: (-item[1], item[0]))
+        pairs, _ = pairings.swiss(standings, played)
+        for army1, army2 in pairs:
+            played[frozenset((army1, army2))] += 1
+            points[army1] += rng.randrange(21)
+            points[army2] += rng.randrange(21)
+    return sorted(points.items(), key=lambda item: (-item[1], item[0])), played
+
+
+class Command(BaseCommand):
+    help = "Time Swiss pairing and round robin scheduling for leagues of increasing size"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--armies', type=int, nargs='+', default=[100, 250, 500, 1000, 2000])
+        parser.add_argument('--rounds', type=int, default=8, help="Rounds already played before timing")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = Random(0)
+        self.stdout.write("{:>7} {:>12} {:>12} {:>10}".format('armies', 'swiss ms', 'rr ms', 'rematches'))
+        for armies in options['armies']:
+            standings, played = synthetic_league(armies, options['rounds'], rng)
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                pairs, _ = pairings.swiss(standings, played)
+                timings.append(time.perf_counter() - started)
+            rematches = sum(1 for pair in pairs if played[frozenset(pair)])
+            started = time.perf_counter()
+            pairings.round_robin([army_id for army_id, _ in standings])
+            schedule = time.perf_counter() - started
+            self.stdout.write("{:>7} {:>12.1f} {:>12.1f} {:>10}".format(
+                armies, min(timings) * 1000, schedule * 1000, rematches))
@@ -0,0 +1,53 @@
+import gc
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home import snapshots
+from home.models import Army, Battle
+from ._fixtures import Rollback, build_league
+
+
+def retained(build):
+    """ Seconds to build, bytes still held by the result and peak bytes while building """
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+class Command(BaseCommand):
+    help = "Compare the memory held by a league snapshot with the model instances the pages used to load"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--battles', type=int, default=20000)
+        parser.add_argument('--armies', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write("{:<10} {:>10} {:>14} {:>14}".format('holder', 'build ms', 'retained', 'peak'))
+        try:
+            with transaction.atomic():
+                league = build_league(options['armies'], options['battles'])
+
+                def instances():
+                    return (list(Army.objects.filter(league=league).select_related('user')),
+                            list(Battle.objects.filter(league=league).order_by('-date')
+                                 .select_related('army1__user', 'army2__user')))
+
+                def snapshot():
+                    return snapshots.LeagueSnapshot.build(league.id, 0)
+
+                for label, build in (('models', instances), ('snapshot', snapshot)):
+                    elapsed, current, peak = retained(build)
+                    self.stdout.write("{:<10} {:>10.1f} {:>14,} {:>14,}".format(label, elapsed * 1000, current, peak))
+                self.stdout.write("snapshot estimate used by the process cache: {:,} bytes".format(snapshot().nbytes))
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from home import purge
+
+
+class Command(BaseCommand):
+    help = "Remove the rows and images of leagues that have been deleted but not yet purged"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=purge.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        purge.purge_deleted_leagues(options['chunk_size'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from home import events, projections
+
+
+class Command(BaseCommand):
+    help = "Rebuild the standings, stats and ratings projections by replaying the battle event log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', help="Rebuild just this projection, may be repeated",
+                            choices=[projection.name for projection in projections.PROJECTIONS])
+        parser.add_argument('--chunk-size', type=int, default=events.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chosen = [projection for projection in projections.PROJECTIONS
+                  if not options['only'] or projection.name in options['only']]
+        projections.rebuild(chosen, options['chunk_size'])
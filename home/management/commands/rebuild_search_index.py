@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home import search
+from home.models import League, Army
+
+
+class Command(BaseCommand):
+    help = "Drop and recreate the league and army search index"
+
+    def handle(self, *args, **options):
+        search.rebuild(League.objects.all(), Army.objects.all())
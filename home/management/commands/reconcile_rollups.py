@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from home import events, projections
+
+
+class Command(BaseCommand):
+    help = "Correct any drift of the player and allegiance rollups from the battles they were built from"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=events.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        projections.STATS.reconcile(options['chunk_size'])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from home import jobs, projections
+
+
+class Command(BaseCommand):
+    help = "Run queued jobs, polling the queue until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=jobs.BATCH_SIZE)
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due")
+
+    def handle(self, *args, **options):
+        projections.schedule_reconcile()
+        while True:
+            if jobs.run_pending(options['batch_size']):
+                continue
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,71 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:21
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_daily_points(apps, schema_editor):
+    Battle = apps.get_model('home', 'Battle')
+    DailyPoints = apps.get_model('home', 'DailyPoints')
+    per_day = defaultdict(int)
+    for league_id, day, army1_id, army2_id, army1_pts, army2_pts in Battle.objects.values_list(
+            'league_id', 'date', 'army1_id', 'army2_id', 'army1_pts', 'army2_pts').iterator():
+        if army1_id is not None:
+            per_day[(army1_id, day, league_id)] += army1_pts
+        if army2_id is not None:
+            per_day[(army2_id, day, league_id)] += army2_pts
+    totals = defaultdict(int)
+    rows = []
+    for army_id, day, league_id in sorted(per_day):
+        totals[army_id] += per_day[(army_id, day, league_id)]
+        rows.append(DailyPoints(league_id=league_id, army_id=army_id, date=day,
+                                points=per_day[(army_id, day, league_id)], total=totals[army_id]))
+    DailyPoints.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0009_auto_20200212_1134'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='battle',
+            name='army1_pts',
+            field=models.PositiveIntegerField(verbose_name='Your Points Earned'),
+        ),
+        migrations.AlterField(
+            model_name='battle',
+            name='army2_pts',
+            field=models.PositiveIntegerField(verbose_name='Enemy Points Earned'),
+        ),
+        migrations.AlterField(
+            model_name='battle',
+            name='date',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now, verbose_name='Date'),
+        ),
+        migrations.CreateModel(
+            name='DailyPoints',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('points', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('army', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.Army')),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.League')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailypoints',
+            index=models.Index(fields=['league', 'date'], name='daily_league_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailypoints',
+            constraint=models.UniqueConstraint(fields=('army', 'date'), name='unique_army_day'),
+        ),
+        migrations.RunPython(backfill_daily_points, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0010_auto_20261019_1821'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0011_league_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='army',
+            name='allegiance',
+            field=models.CharField(choices=[('BOC', 'Beasts of Chaos'), ('KRN', 'Khorne'), ('NUR', 'Nurgle'), ('SKN', 'Skaven'), ('SLA', 'Slaanesh'), ('TZN', 'Tzeentch'), ('STD', 'Slaves to Darkness'), ('LON', 'Legions of Nagash'), ('NGT', 'Nighthaunt'), ('OBR', 'Ossiarch Bonereapers'), ('FEC', 'Flesh Eater Courts'), ('BCR', 'Beastclaw Raiders'), ('GSG', 'Gloomspite Gitz'), ('OGR', 'Ogor Mawtribes'), ('ORK', 'Orruk Warclans'), ('COS', 'Cities of Sigmar'), ('DOK', 'Daughters of Khaine'), ('FYR', 'Fyreslayers'), ('IDK', 'Idoneth Deepkin'), ('KRO', 'Kharadron Overlords'), ('SER', 'Seraphon'), ('SCE', 'Stormcast Eternals'), ('SYL', 'Sylvaneth')], db_index=True, default='BOC', max_length=3, verbose_name='Allegiance'),
+        ),
+        migrations.AlterField(
+            model_name='army',
+            name='title',
+            field=models.CharField(db_index=True, max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='league',
+            name='title',
+            field=models.CharField(db_index=True, max_length=128),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:27
+
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    Army = apps.get_model('home', 'Army')
+    Battle = apps.get_model('home', 'Battle')
+    PlayerRollup = apps.get_model('home', 'PlayerRollup')
+    AllegianceRollup = apps.get_model('home', 'AllegianceRollup')
+    armies = {pk: (user_id, allegiance) for pk, user_id, allegiance
+              in Army.objects.values_list('pk', 'user_id', 'allegiance').iterator()}
+    players, allegiances = defaultdict(Counter), defaultdict(Counter)
+    battles = Battle.objects.filter(league__deleted_at__isnull=True) \
+        .values_list('date', 'army1_id', 'army2_id', 'army1_pts', 'army2_pts')
+    for day, army1_id, army2_id, army1_pts, army2_pts in battles.iterator():
+        for army_id, own, other in ((army1_id, army1_pts, army2_pts), (army2_id, army2_pts, army1_pts)):
+            if army_id in armies:
+                user_id, allegiance = armies[army_id]
+                record = Counter(battles=1, wins=int(own > other), draws=int(own == other),
+                                 losses=int(own < other), points=own)
+                players[user_id].update(record)
+                allegiances[(allegiance, date(day.year, day.month, 1))].update(record)
+    fields = ('battles', 'wins', 'draws', 'losses', 'points')
+    PlayerRollup.objects.bulk_create(
+        [PlayerRollup(user_id=user_id, **{field: record[field] for field in fields})
+         for user_id, record in players.items()], batch_size=500)
+    AllegianceRollup.objects.bulk_create(
+        [AllegianceRollup(allegiance=allegiance, month=month, **{field: record[field] for field in fields})
+         for (allegiance, month), record in allegiances.items()], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('home', '0012_auto_20261019_1825'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllegianceRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('allegiance', models.CharField(choices=[('BOC', 'Beasts of Chaos'), ('KRN', 'Khorne'), ('NUR', 'Nurgle'), ('SKN', 'Skaven'), ('SLA', 'Slaanesh'), ('TZN', 'Tzeentch'), ('STD', 'Slaves to Darkness'), ('LON', 'Legions of Nagash'), ('NGT', 'Nighthaunt'), ('OBR', 'Ossiarch Bonereapers'), ('FEC', 'Flesh Eater Courts'), ('BCR', 'Beastclaw Raiders'), ('GSG', 'Gloomspite Gitz'), ('OGR', 'Ogor Mawtribes'), ('ORK', 'Orruk Warclans'), ('COS', 'Cities of Sigmar'), ('DOK', 'Daughters of Khaine'), ('FYR', 'Fyreslayers'), ('IDK', 'Idoneth Deepkin'), ('KRO', 'Kharadron Overlords'), ('SER', 'Seraphon'), ('SCE', 'Stormcast Eternals'), ('SYL', 'Sylvaneth')], max_length=3)),
+                ('month', models.DateField()),
+                ('battles', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('draws', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('points', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerRollup',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('battles', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('draws', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('points', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playerrollup',
+            index=models.Index(fields=['-points', 'user'], name='player_leaderboard'),
+        ),
+        migrations.AddIndex(
+            model_name='allegiancerollup',
+            index=models.Index(fields=['month'], name='allegiance_month'),
+        ),
+        migrations.AddConstraint(
+            model_name='allegiancerollup',
+            constraint=models.UniqueConstraint(fields=('allegiance', 'month'), name='unique_allegiance_month'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# The schema and documents as they stood when the index was introduced, from then on the league and army signals
+# keep it up to date. Leagues and armies share the index, ids interleave so each row keys on one integer.
+SCHEMA = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS home_search USING fts5("
+        "league_id UNINDEXED, title, body, prefix='2 3', tokenize='unicode61')",
+    ],
+    'postgresql': [
+        "CREATE TABLE IF NOT EXISTS home_search (id bigint PRIMARY KEY, kind varchar(8) NOT NULL, "
+        "league_id integer NOT NULL, document tsvector NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS home_search_document ON home_search USING GIN (document)",
+        "CREATE INDEX IF NOT EXISTS home_search_league ON home_search (league_id)",
+    ],
+}
+
+INSERT = {
+    'sqlite': "INSERT INTO home_search(rowid, league_id, title, body) VALUES (%s, %s, %s, %s)",
+    'postgresql': "INSERT INTO home_search (id, kind, league_id, document) VALUES (%s, %s, %s, "
+                  "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))",
+}
+KINDS = ('league', 'army')
+CHUNK_SIZE = 1000
+
+
+def documents(apps):
+    League = apps.get_model('home', 'League')
+    Army = apps.get_model('home', 'Army')
+    labels = dict(Army._meta.get_field('allegiance').flatchoices)
+    for league in League.objects.filter(deleted_at__isnull=True).select_related('owner').iterator(CHUNK_SIZE):
+        yield ('league', league.id, league.id, league.title,
+               '{} {}'.format(league.description, league.owner.username))
+    for army in Army.objects.filter(league__deleted_at__isnull=True).select_related('user').iterator(CHUNK_SIZE):
+        yield ('army', army.id, army.league_id, army.title,
+               '{} {}'.format(army.user.username, labels.get(army.allegiance, army.allegiance)))
+
+
+def rows(vendor, chunk):
+    for kind, object_id, league_id, title, body in chunk:
+        doc_id = object_id * len(KINDS) + KINDS.index(kind)
+        if vendor == 'sqlite':
+            yield doc_id, league_id, title, body
+        else:
+            yield doc_id, kind, league_id, title, body
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in SCHEMA.get(vendor, []):
+        schema_editor.execute(statement)
+    if vendor not in INSERT:
+        return
+    chunk = []
+    with schema_editor.connection.cursor() as cursor:
+        for document in documents(apps):
+            chunk.append(document)
+            if len(chunk) >= CHUNK_SIZE:
+                cursor.executemany(INSERT[vendor], list(rows(vendor, chunk)))
+                chunk = []
+        cursor.executemany(INSERT[vendor], list(rows(vendor, chunk)))
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute("DROP TABLE IF EXISTS home_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0013_auto_20261019_1827'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
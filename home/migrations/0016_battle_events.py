@@ -0,0 +1,110 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:41
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copies of the event encoding and the Elo update as they were when the log was introduced
+INITIAL_RATING = 1000
+K_FACTOR = 32
+PROJECTIONS = ('standings', 'stats', 'ratings')
+
+
+def encode(row):
+    day, army1_id, army2_id, army1_pts, army2_pts = row
+    return json.dumps([day.isoformat(), army1_id, army2_id, army1_pts, army2_pts])
+
+
+def expected(rating, other):
+    return 1 / (1 + 10 ** ((other - rating) / 400))
+
+
+def backfill_events(apps, schema_editor):
+    """ Log every existing battle as created, in date order, and mark the live projections as caught up """
+    League = apps.get_model('home', 'League')
+    Battle = apps.get_model('home', 'Battle')
+    BattleEvent = apps.get_model('home', 'BattleEvent')
+    ProjectionState = apps.get_model('home', 'ProjectionState')
+    ArmyRating = apps.get_model('home', 'ArmyRating')
+    for league in League.objects.iterator():
+        battles = Battle.objects.filter(league=league).order_by('date', 'pk') \
+            .values_list('pk', 'date', 'army1_id', 'army2_id', 'army1_pts', 'army2_pts')
+        ratings = {}
+        chunk = []
+        seq = 0
+        for seq, (pk, *row) in enumerate(battles.iterator(), 1):
+            chunk.append(BattleEvent(league=league, seq=seq, battle_id=pk, kind='created', after=encode(row)))
+            if len(chunk) >= 500:
+                BattleEvent.objects.bulk_create(chunk)
+                chunk = []
+            _, army1_id, army2_id, army1_pts, army2_pts = row
+            if army1_id is None or army2_id is None:
+                continue
+            first = ratings.setdefault(army1_id, [INITIAL_RATING, 0])
+            second = ratings.setdefault(army2_id, [INITIAL_RATING, 0])
+            score = 1 if army1_pts > army2_pts else 0.5 if army1_pts == army2_pts else 0
+            change = K_FACTOR * (score - expected(first[0], second[0]))
+            first[0], second[0] = first[0] + change, second[0] - change
+            first[1] += 1
+            second[1] += 1
+        BattleEvent.objects.bulk_create(chunk)
+        if league.deleted_at is None:
+            ArmyRating.objects.bulk_create([ArmyRating(army_id=army_id, league=league, rating=rating, battles=played)
+                                            for army_id, (rating, played) in ratings.items()], batch_size=500)
+            ProjectionState.objects.bulk_create([ProjectionState(name=name, league=league, last_seq=seq)
+                                                 for name in PROJECTIONS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0015_auto_20261019_1831'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectionState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=16)),
+                ('last_seq', models.PositiveIntegerField(default=0)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.League')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BattleEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('battle_id', models.PositiveIntegerField(db_index=True)),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=8)),
+                ('before', models.TextField(blank=True)),
+                ('after', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+                ('league', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='home.League')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArmyRating',
+            fields=[
+                ('army', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating', serialize=False, to='home.Army')),
+                ('rating', models.FloatField(default=1000)),
+                ('battles', models.PositiveIntegerField(default=0)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.League')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='projectionstate',
+            constraint=models.UniqueConstraint(fields=('name', 'league'), name='unique_projection_league'),
+        ),
+        migrations.AddConstraint(
+            model_name='battleevent',
+            constraint=models.UniqueConstraint(fields=('league', 'seq'), name='unique_league_seq'),
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
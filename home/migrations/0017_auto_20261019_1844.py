@@ -0,0 +1,21 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0016_battle_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['army1', '-date', '-id'], name='battle_army1_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['army2', '-date', '-id'], name='battle_army2_feed'),
+        ),
+    ]
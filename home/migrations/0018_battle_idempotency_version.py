@@ -0,0 +1,23 @@
+# Generated by Django 3.0.3 on 2026-10-19 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0017_auto_20261019_1844'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='idempotency_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.3 on 2026-10-19 19:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0018_battle_idempotency_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('ratings', models.TextField()),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.League')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ratingcheckpoint',
+            constraint=models.UniqueConstraint(fields=('league', 'seq'), name='unique_rating_checkpoint'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.3 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0019_rating_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
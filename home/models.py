@@ -3,17 +3,35 @@ from uuid import uuid4
 from django.urls import reverse
 from django.utils import timezone
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction, DatabaseError
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 
 
+class LeagueManager(models.Manager):
+    """ Hide leagues that have been deleted but not yet purged """
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
+class LeagueMemberManager(models.Manager):
+    """ Hide rows belonging to leagues that have been deleted but not yet purged """
+    def get_queryset(self):
+        return super().get_queryset().filter(league__deleted_at__isnull=True)
+
+
 class League(models.Model):
-    title = models.CharField(max_length=128, blank=False, null=False)
+    title = models.CharField(max_length=128, blank=False, null=False, db_index=True)
     description = models.TextField(blank=False, null=False)
     image = models.ImageField(upload_to='league', blank=False, null=False)
     password = models.UUIDField(blank=False, null=False, default=uuid4, editable=False)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     current_points = models.PositiveIntegerField(blank=False, null=False, default=500)
+    deleted_at = models.DateTimeField(blank=True, null=True, editable=False, db_index=True)
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = LeagueManager()
+    all_objects = models.Manager()
 
     class Meta:
         constraints = [
@@ -23,6 +41,16 @@ class League(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """ The version only moves forward through snapshots.bump(), a copy read earlier never writes it back """
+        if not self._state.adding and not force_insert:
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields
+                                 if not field.primary_key and field.name != 'version']
+            else:
+                update_fields = [name for name in update_fields if name != 'version']
+        super().save(force_insert, force_update, using, update_fields)
+
     def get_absolute_url(self):
         return reverse('league-detail', args=[str(self.id)])
 
@@ -54,7 +82,7 @@ class Allegiance(models.TextChoices):
 
 
 class Army(models.Model):
-    title = models.CharField(max_length=128)
+    title = models.CharField(max_length=128, db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='army', blank=False, null=False)
     league = models.ForeignKey(League, on_delete=models.CASCADE)
@@ -64,9 +92,13 @@ class Army(models.Model):
         max_length=3,
         choices=Allegiance.choices,
         default=Allegiance.BOC,
-        verbose_name="Allegiance"
+        verbose_name="Allegiance",
+        db_index=True
     )
 
+    objects = LeagueMemberManager()
+    all_objects = models.Manager()
+
     def __str__(self):
         return self.title
 
@@ -80,8 +112,12 @@ class Army(models.Model):
         return reverse('league-detail', args=[str(self.league.id)])
 
 
+class StaleBattle(DatabaseError):
+    """ The battle was changed or deleted after the copy being saved was read """
+
+
 class Battle(models.Model):
-    date = models.DateField(blank=False, null=False, default=timezone.now, verbose_name="Date")
+    date = models.DateField(blank=False, null=False, default=timezone.now, verbose_name="Date", db_index=True)
     league = models.ForeignKey(League, on_delete=models.CASCADE, default=None)
     army1 = models.ForeignKey(
         Army,
@@ -101,10 +137,43 @@ class Battle(models.Model):
     )
     army1_pts = models.PositiveIntegerField(blank=False, null=False, verbose_name="Your Points Earned")
     army2_pts = models.PositiveIntegerField(blank=False, null=False, verbose_name="Enemy Points Earned")
+    idempotency_key = models.UUIDField(blank=True, null=True, unique=True, editable=False)
+    version = models.PositiveIntegerField(default=0)
+
+    objects = LeagueMemberManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['army1', '-date', '-id'], name="battle_army1_feed"),
+            models.Index(fields=['army2', '-date', '-id'], name="battle_army2_feed"),
+        ]
 
     def __str__(self):
         return "{} vs {}".format(self.army1.title, self.army2.title)
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Optimistic locking, an existing battle is only written over the version this copy was read at. The row is
+        first moved to the next version by a compare and swap, StaleBattle is raised when no row matched.
+        """
+        if self._state.adding or force_insert:
+            return super().save(force_insert, force_update, using, update_fields)
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'version'}
+        using = using or router.db_for_write(Battle, instance=self)
+        read = self.version
+        try:
+            with transaction.atomic(using=using):
+                if not Battle.all_objects.using(using).filter(pk=self.pk, version=read) \
+                        .update(version=F('version') + 1):
+                    raise StaleBattle("Battle {} is no longer at version {}".format(self.pk, read))
+                self.version = read + 1
+                super().save(force_insert, force_update, using, update_fields)
+        except Exception:
+            self.version = read
+            raise
+
     def get_winner_id(self):
         if self.army1_pts == self.army2_pts:
             return False
@@ -113,3 +182,172 @@ class Battle(models.Model):
 
     def get_absolute_url(self):
         return reverse('league-detail', args=[str(self.league.id)])
+
+
+class DailyPoints(models.Model):
+    """ Running points total of an army at the end of each day it played a battle """
+    league = models.ForeignKey(League, on_delete=models.CASCADE)
+    army = models.ForeignKey(Army, on_delete=models.CASCADE)
+    date = models.DateField(blank=False, null=False)
+    points = models.PositiveIntegerField(blank=False, null=False, default=0)
+    total = models.PositiveIntegerField(blank=False, null=False, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['army', 'date'], name="unique_army_day")
+        ]
+        indexes = [
+            models.Index(fields=['league', 'date'], name="daily_league_date"),
+        ]
+
+    def __str__(self):
+        return "{} on {}: {}".format(self.army_id, self.date, self.total)
+
+
+class PlayerRollup(models.Model):
+    """ Site-wide battle record of a player across every league """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True)
+    battles = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-points', 'user'], name="player_leaderboard"),
+        ]
+
+    def __str__(self):
+        return "{}: {}".format(self.user_id, self.points)
+
+
+class AllegianceRollup(models.Model):
+    """ Battle record of an allegiance in one calendar month """
+    allegiance = models.CharField(max_length=3, choices=Allegiance.choices)
+    month = models.DateField()
+    battles = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['allegiance', 'month'], name="unique_allegiance_month")
+        ]
+        indexes = [
+            models.Index(fields=['month'], name="allegiance_month"),
+        ]
+
+    def __str__(self):
+        return "{} in {:%Y-%m}: {}".format(self.allegiance, self.month, self.battles)
+
+
+class Job(models.Model):
+    """ Unit of deferred work picked up by the run_jobs worker """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        RUNNING = "running", _("Running")
+        FAILED = "failed", _("Failed")
+
+    name = models.CharField(max_length=64)
+    payload = models.TextField(default='{}')
+    status = models.CharField(max_length=8, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name="job_due"),
+        ]
+
+    def __str__(self):
+        return "{} #{} ({})".format(self.name, self.id, self.status)
+
+
+class BattleEvent(models.Model):
+    """
+    Append-only record of a battle being created, updated or deleted, numbered in order within its league.
+    Rows are JSON [date, army1 id, army2 id, army1 pts, army2 pts] lists, empty before a create and after a delete.
+    The log outlives the battles and armies it mentions, so none of its references are constrained.
+    """
+
+    class Kind(models.TextChoices):
+        CREATED = "created", _("Created")
+        UPDATED = "updated", _("Updated")
+        DELETED = "deleted", _("Deleted")
+
+    league = models.ForeignKey(League, on_delete=models.DO_NOTHING, db_constraint=False)
+    seq = models.PositiveIntegerField()
+    battle_id = models.PositiveIntegerField(db_index=True)
+    kind = models.CharField(max_length=8, choices=Kind.choices)
+    before = models.TextField(blank=True)
+    after = models.TextField(blank=True)
+    actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False,
+                              blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['league', 'seq'], name="unique_league_seq")
+        ]
+
+    def __str__(self):
+        return "{} #{}: battle {} {}".format(self.league_id, self.seq, self.battle_id, self.kind)
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Battle events are append-only")
+        super().save(*args, **kwargs)
+
+
+class ProjectionState(models.Model):
+    """ Sequence number of the last battle event of a league that a projection has applied """
+    name = models.CharField(max_length=16)
+    league = models.ForeignKey(League, on_delete=models.CASCADE)
+    last_seq = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'league'], name="unique_projection_league")
+        ]
+
+    def __str__(self):
+        return "{} of {} at {}".format(self.name, self.league_id, self.last_seq)
+
+
+INITIAL_RATING = 1000
+
+
+class ArmyRating(models.Model):
+    """ Elo rating of an army over the results reported in its league, in the order they were reported """
+    army = models.OneToOneField(Army, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    league = models.ForeignKey(League, on_delete=models.CASCADE)
+    rating = models.FloatField(default=INITIAL_RATING)
+    battles = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "{}: {:.0f}".format(self.army_id, self.rating)
+
+
+class RatingCheckpoint(models.Model):
+    """
+    Every army rating of a league once the battles first reported up to seq had been rated, stored as a JSON
+    {army id: [rating, battles]} object. Replays after an edit start from the last one before the edited battle.
+    """
+    league = models.ForeignKey(League, on_delete=models.CASCADE)
+    seq = models.PositiveIntegerField()
+    ratings = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['league', 'seq'], name="unique_rating_checkpoint")
+        ]
+
+    def __str__(self):
+        return "{} at {}".format(self.league_id, self.seq)
@@ -0,0 +1,14 @@
+from django.template.loader import render_to_string
+
+from . import jobs, mail
+from .models import Battle
+
+
+@jobs.job('notify_opponent')
+def notify_opponent(battle_id):
+    """ Tell the owner of the enemy army that a battle was recorded against them """
+    battle = Battle.objects.select_related('league', 'army1__user', 'army2__user').filter(pk=battle_id).first()
+    if battle is None or battle.army2 is None or not battle.army2.user.email:
+        return
+    body = render_to_string('home/email/battle_recorded.txt', {'battle': battle})
+    mail.send("New battle in {}".format(battle.league.title), body, [battle.army2.user.email])
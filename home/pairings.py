@@ -0,0 +1,117 @@
+from collections import Counter
+
+import networkx
+
+from .models import Battle
+from .standings import points_as_of
+
+WINDOW = 6
+REMATCH_PENALTY = 10 ** 9
+
+
+def live_standings(league_id):
+    """ (army id, points) of the active armies, best first """
+    armies = points_as_of(league_id).filter(active=True).order_by('-points', 'id')
+    return [(army.id, army.points) for army in armies]
+
+
+def head_to_head(league_id):
+    """ How many times each pair of armies has met, keyed by frozenset of their ids """
+    played = Counter()
+    for army1_id, army2_id in Battle.objects.filter(league_id=league_id).values_list('army1_id', 'army2_id').iterator():
+        played[frozenset((army1_id, army2_id))] += 1
+    return played
+
+
+def swiss(standings, played, window=WINDOW):
+    """
+    Pair (army id, points) standings, best first, into the next Swiss round.
+
+    Solves a minimum cost perfect matching where a pair costs the square of its points gap, plus the square of
+    how many places apart the two stand so that equal gaps go to the closer neighbours, plus a heavy penalty per
+    previous meeting. Partners are looked for within ``window`` places of each other, which keeps the dynamic
+    programme linear in the number of armies. Late in a league the closest unplayed opponents can lie further
+    apart than that, so when the band can only be paired with a rematch the matching is solved again by blossom
+    over a band that doubles until it pairs everyone without one or spans the whole table.
+
+    With an odd count the lowest ranked army that has not sat out yet gets the bye. Rounds are not stored, so an
+    army that has played fewer battles than the busiest ones is taken to have had its bye already.
+    Returns (pairs, bye).
+    """
+    standings = list(standings)
+    bye = None
+    if len(standings) % 2:
+        games = Counter()
+        for pair, times in played.items():
+            for army_id in pair:
+                games[army_id] += times
+        most = max(games[army_id] for army_id, _ in standings)
+        position = max(i for i, (army_id, _) in enumerate(standings) if games[army_id] == most)
+        bye = standings.pop(position)[0]
+    count = len(standings)
+    ids = [army_id for army_id, _ in standings]
+    points = [pts for _, pts in standings]
+
+    def cost(i, j):
+        return (points[i] - points[j]) ** 2 + (j - i) ** 2 + REMATCH_PENALTY * played[frozenset((ids[i], ids[j]))]
+
+    # states[mask] is the cheapest cost so far, bit k of mask marks position i + k as already paired
+    states = {0: 0}
+    back = []
+    for i in range(count):
+        reached, came_from = {}, {}
+        for mask, total in states.items():
+            if mask & 1:
+                moves = [(mask >> 1, total, None)]
+            else:
+                moves = [((mask | 1 << k) >> 1, total + cost(i, i + k), k)
+                         for k in range(1, min(window, count - i)) if not mask & 1 << k]
+            for new_mask, new_total, k in moves:
+                if new_mask not in reached or new_total < reached[new_mask]:
+                    reached[new_mask] = new_total
+                    came_from[new_mask] = (mask, k)
+        states = reached
+        back.append(came_from)
+
+    pairs = []
+    mask = 0
+    for i in reversed(range(count)):
+        mask, k = back[i][mask]
+        if k is not None:
+            pairs.append((i, i + k))
+    pairs.reverse()
+    span = window
+    while any(played[frozenset((ids[i], ids[j]))] for i, j in pairs) and span < count:
+        span *= 2
+        pairs = _matching(count, cost, span)
+    return [(ids[i], ids[j]) for i, j in pairs], bye
+
+
+def _matching(count, cost, span):
+    """ Cheapest perfect matching of positions fewer than span places apart, as sorted (i, j) pairs """
+    edges = [(i, j, cost(i, j)) for i in range(count) for j in range(i + 1, min(i + span, count))]
+    # Every perfect matching has the same number of pairs, so the heaviest one under top - cost is the cheapest
+    top = max(weight for _, _, weight in edges) + 1
+    graph = networkx.Graph()
+    graph.add_weighted_edges_from((i, j, top - weight) for i, j, weight in edges)
+    return sorted(tuple(sorted(pair)) for pair in networkx.max_weight_matching(graph, maxcardinality=True))
+
+
+def round_robin(army_ids):
+    """ Every round of a single round robin by the circle method, as a list of (pairs, bye) """
+    ids = list(army_ids)
+    if len(ids) % 2:
+        ids.append(None)
+    count = len(ids)
+    rounds = []
+    for _ in range(count - 1):
+        pairs, bye = [], None
+        for i in range(count // 2):
+            pair = (ids[i], ids[count - 1 - i])
+            if None in pair:
+                bye = pair[0] if pair[1] is None else pair[1]
+            else:
+                pairs.append(pair)
+        rounds.append((pairs, bye))
+        ids = [ids[0], ids[-1]] + ids[1:-1]
+    return rounds
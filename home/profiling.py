@@ -0,0 +1,195 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '__profile'
+SALT = 'home.profiling'
+TOKEN_MAX_AGE = 60 * 60
+INTERVAL = 0.002
+TIMEOUT = 24 * 60 * 60
+
+
+def buffer_size():
+    return getattr(settings, 'PROFILING_BUFFER_SIZE', 20)
+
+
+def make_token(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def check_token(token, user):
+    try:
+        return signing.TimestampSigner(salt=SALT).unsign(token, max_age=TOKEN_MAX_AGE) == str(user.pk)
+    except signing.BadSignature:
+        return False
+
+
+def _label(code):
+    path = code.co_filename.replace('\\', '/').split('/')
+    return '{} ({}:{})'.format(code.co_name, '/'.join(path[-2:]), code.co_firstlineno)
+
+
+class Sampler(threading.Thread):
+    """ Records the call stack of one thread every few milliseconds until stopped """
+
+    def __init__(self, target_ident, interval=INTERVAL):
+        super().__init__(daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def stop(self):
+        self.done.set()
+        self.join()
+
+
+class QueryTrace:
+    """ Database execute wrapper keeping each statement and how long it took """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, round((time.perf_counter() - started) * 1000, 3)))
+
+
+class Profile:
+    def __init__(self, request):
+        self.request = request
+        self.started = timezone.now()
+        self.clock = time.perf_counter()
+        self.trace = QueryTrace()
+        self.sampler = Sampler(threading.get_ident())
+        connection.execute_wrappers.append(self.trace)
+        self.sampler.start()
+
+    def finish(self, status):
+        self.sampler.stop()
+        connection.execute_wrappers.remove(self.trace)
+        store({
+            'path': self.request.get_full_path(),
+            'method': self.request.method,
+            'user': self.request.user.get_username(),
+            'started': self.started,
+            'duration': round((time.perf_counter() - self.clock) * 1000, 1),
+            'status': status,
+            'samples': sorted(self.sampler.stacks.items(), key=lambda item: -item[1]),
+            'queries': self.trace.queries,
+        })
+
+
+def store(record):
+    """ Keep the record in a fixed number of cache slots, overwriting the oldest """
+    cache.add('profiling:next', 0, None)
+    number = cache.incr('profiling:next')
+    record['id'] = number
+    cache.set('profiling:slot:{}'.format(number % buffer_size()), record, TIMEOUT)
+    return number
+
+
+def recent():
+    slots = cache.get_many(['profiling:slot:{}'.format(slot) for slot in range(buffer_size())])
+    return sorted(slots.values(), key=lambda record: -record['id'])
+
+
+def get(number):
+    record = cache.get('profiling:slot:{}'.format(number % buffer_size()))
+    return record if record and record['id'] == number else None
+
+
+def call_tree(samples):
+    """ Nested {'name', 'count', 'children'} nodes of the sampled stacks, heaviest first """
+    root = {'name': 'all', 'count': 0, 'children': {}}
+    for stack, count in samples:
+        root['count'] += count
+        node = root
+        for name in stack:
+            node = node['children'].setdefault(name, {'name': name, 'count': 0, 'children': {}})
+            node['count'] += count
+
+    def ordered(node):
+        children = sorted(node['children'].values(), key=lambda child: -child['count'])
+        return dict(node, children=[ordered(child) for child in children])
+    return ordered(root)
+
+
+def outline(tree):
+    """
+    The call tree as a flat list of rows in document order, so a template can nest <details> elements without
+    recursing once per stack frame. Each row says how many elements close after it, its own included for leaves.
+    """
+    rows = []
+    pending = [(tree, 0)]
+    while pending:
+        node, depth = pending.pop()
+        rows.append({'name': node['name'], 'count': node['count'], 'depth': depth,
+                     'open': node['count'] * 2 >= tree['count'], 'closing': 0})
+        if node['children']:
+            pending.extend((child, depth + 1) for child in reversed(node['children']))
+        next_depth = pending[-1][1] if pending else 0
+        if not node['children']:
+            rows[-1]['closing'] = depth - next_depth + 1
+    for row in rows:
+        row['closing'] = range(row['closing'])
+    return rows
+
+
+def folded(samples):
+    """ Stacks in the folded format read by flamegraph.pl, inferno and speedscope """
+    return ''.join('{} {}\n'.format(';'.join(stack), count) for stack, count in samples)
+
+
+class ProfilingMiddleware:
+    """ Profile a single request for staff who send a signed X-Profile header or __profile query parameter """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if HEADER not in request.META and QUERY_FLAG not in request.META.get('QUERY_STRING', ''):
+            return self.get_response(request)
+        token = request.META.get(HEADER) or request.GET.get(QUERY_FLAG, '')
+        if not request.user.is_staff or not check_token(token, request.user):
+            return self.get_response(request)
+
+        profile = Profile(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.finish(500)
+            raise
+        if not response.streaming:
+            profile.finish(response.status_code)
+            return response
+
+        def content(chunks):
+            # Streamed pages do most of their work while the body is iterated
+            try:
+                yield from chunks
+            finally:
+                profile.finish(response.status_code)
+        response.streaming_content = content(response.streaming_content)
+        return response
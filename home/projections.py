@@ -0,0 +1,274 @@
+import json
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import events, jobs, rollups, snapshots, standings
+from .models import League, Army, BattleEvent, DailyPoints, ProjectionState, ArmyRating, RatingCheckpoint, \
+    PlayerRollup, AllegianceRollup, Job, INITIAL_RATING
+
+K_FACTOR = 32
+CHECKPOINT_EVERY = 200
+RECONCILE_EVERY = timedelta(days=1)
+RECONCILE_GROUP = 100
+
+
+class Projection:
+    """ Data derived from the battle event log, kept up to date by applying each league's newer events """
+    name = None
+
+    def reset(self):
+        """ Drop everything the projection has built, for every league """
+        raise NotImplementedError
+
+    def apply(self, league, chunk):
+        """ Fold a chunk of the league's events, in sequence order, into the projection """
+        raise NotImplementedError
+
+
+class StandingsProjection(Projection):
+    """ Daily running points totals, repaired from the earliest day an event touched """
+    name = 'standings'
+
+    def reset(self):
+        DailyPoints.objects.all().delete()
+
+    def apply(self, league, chunk):
+        armies, since = set(), None
+        for event in chunk:
+            for row in events.rows(event):
+                if row:
+                    armies.update(row[1:3])
+                    since = row[0] if since is None else min(since, row[0])
+        if armies:
+            standings.repair(league.id, armies, since)
+
+
+class StatsProjection(Projection):
+    """ Player and allegiance rollups, each event takes out its old row and adds its new one """
+    name = 'stats'
+
+    def reset(self):
+        PlayerRollup.objects.all().delete()
+        AllegianceRollup.objects.all().delete()
+
+    def apply(self, league, chunk):
+        before, after = zip(*(events.rows(event) for event in chunk))
+        rollups.apply(*rollups.battle_totals([row for row in before if row]), sign=-1)
+        rollups.apply(*rollups.battle_totals([row for row in after if row]))
+
+    def reconcile(self, chunk_size=events.CHUNK_SIZE, group_size=RECONCILE_GROUP):
+        """
+        Bring both rollup tables back in line with the battles this projection has applied, as replayed from the
+        log. Player rows are taken a group of players at a time and allegiance rows an allegiance at a time, each
+        in its own transaction that locks only the states of the leagues those armies play in. Only the difference
+        is written back, so a chunk applied before or after the scan is neither lost nor counted twice.
+        """
+        leagues = list(League.objects.values_list('pk', flat=True))
+        ProjectionState.objects.bulk_create([ProjectionState(name=self.name, league_id=league_id)
+                                             for league_id in leagues], ignore_conflicts=True)
+        armies = Army.all_objects.filter(league__deleted_at__isnull=True)
+        users = sorted(set(armies.values_list('user_id', flat=True))
+                       | set(PlayerRollup.objects.values_list('user_id', flat=True)))
+        for start in range(0, len(users), group_size):
+            self._reconcile(PlayerRollup, 'user_id', users[start:start + group_size], 0,
+                            lambda row: row.user_id, lambda user_id: user_id, chunk_size)
+        allegiances = sorted(set(armies.values_list('allegiance', flat=True))
+                             | set(AllegianceRollup.objects.values_list('allegiance', flat=True)))
+        for allegiance in allegiances:
+            self._reconcile(AllegianceRollup, 'allegiance', [allegiance], 1,
+                            lambda row: (row.allegiance, row.month), lambda key: key[0], chunk_size)
+
+    def _reconcile(self, rollup, field, group, part, key, member, chunk_size):
+        """
+        Reconcile the rollup rows whose field is in group against part (0 players, 1 allegiances) of the battle
+        totals. key gives a row's key in those totals and member the group value of such a key.
+        """
+        armies = Army.all_objects.filter(league__deleted_at__isnull=True, **{field + '__in': group})
+        leagues = set(armies.values_list('league_id', flat=True))
+        while True:
+            with transaction.atomic():
+                states = list(ProjectionState.objects.select_for_update()
+                              .filter(name=self.name, league_id__in=leagues, league__deleted_at__isnull=True)
+                              .order_by('pk'))
+                stored = _records(rollup.objects.filter(**{field + '__in': group}), key)
+                # A league adds to the group's rows only once one of its armies belongs to the group, looking
+                # after the rows are read makes sure every league already counted in them is locked
+                joined = set(armies.values_list('league_id', flat=True)) - leagues
+                if not joined:
+                    wanted = defaultdict(Counter)
+                    for state in states:
+                        battles = events.battles(state.league_id, until_seq=state.last_seq, chunk_size=chunk_size)
+                        for total_key, record in rollups.battle_totals(battles)[part].items():
+                            if member(total_key) in group:
+                                wanted[total_key].update(record)
+                    difference = _difference(wanted, stored)
+                    rollups.apply(*((difference, {}) if part == 0 else ({}, difference)))
+                    return
+            leagues |= joined
+
+
+def _records(rollup, key):
+    return {key(row): Counter({field: getattr(row, field) for field in rollups.FIELDS}) for row in rollup}
+
+
+def _difference(wanted, stored):
+    """ Per key records that turn the stored records into the wanted ones """
+    return {key: Counter({field: wanted.get(key, Counter())[field] - stored.get(key, Counter())[field]
+                          for field in rollups.FIELDS})
+            for key in set(wanted) | set(stored)}
+
+
+def expected(rating, other):
+    return 1 / (1 + 10 ** ((other - rating) / 400))
+
+
+class RatingsProjection(Projection):
+    """
+    Elo ratings over results in the order they were reported. New results are rated on top of the stored ratings.
+    An edit or delete rewrites history from the battle it touched, so the league is replayed from the last
+    checkpoint taken before that battle was first reported.
+    """
+    name = 'ratings'
+
+    def reset(self):
+        ArmyRating.objects.all().delete()
+        RatingCheckpoint.objects.all().delete()
+
+    def apply(self, league, chunk):
+        if all(event.kind == BattleEvent.Kind.CREATED for event in chunk):
+            self.rate(league, [(event.seq, events.decode(event.after)) for event in chunk])
+            return
+        edited = {event.battle_id for event in chunk if event.kind != BattleEvent.Kind.CREATED}
+        since = BattleEvent.objects.filter(league=league, battle_id__in=edited, kind=BattleEvent.Kind.CREATED) \
+            .aggregate(since=Min('seq'))['since'] or 0
+        RatingCheckpoint.objects.filter(league=league, seq__gte=since).delete()
+        checkpoint = RatingCheckpoint.objects.filter(league=league).order_by('-seq').first()
+        ArmyRating.objects.filter(league=league).delete()
+        if checkpoint is not None:
+            saved = {int(army_id): value for army_id, value in json.loads(checkpoint.ratings).items()}
+            ArmyRating.objects.bulk_create([
+                ArmyRating(army_id=army_id, league=league, rating=saved[army_id][0], battles=saved[army_id][1])
+                for army_id in Army.all_objects.filter(pk__in=saved).values_list('pk', flat=True)])
+        self.rate(league, events.standing(league.id, checkpoint.seq if checkpoint else 0, chunk[-1].seq))
+
+    def rate(self, league, results):
+        """ Rate (seq, row) results on top of the stored ratings, checkpointing every CHECKPOINT_EVERY events """
+        stored = {rating.army_id: rating for rating in ArmyRating.objects.filter(league=league)}
+        army_ids = {army_id for _, row in results for army_id in row[1:3]} - {None} - set(stored)
+        ratings = dict(stored)
+        ratings.update((army_id, ArmyRating(army_id=army_id, league=league, rating=INITIAL_RATING, battles=0))
+                       for army_id in Army.all_objects.filter(pk__in=army_ids).values_list('pk', flat=True))
+        last = RatingCheckpoint.objects.filter(league=league).aggregate(last=Max('seq'))['last'] or 0
+        checkpoints = []
+        for seq, (_, army1_id, army2_id, army1_pts, army2_pts) in results:
+            if army1_id in ratings and army2_id in ratings:
+                first, second = ratings[army1_id], ratings[army2_id]
+                score = 1 if army1_pts > army2_pts else 0.5 if army1_pts == army2_pts else 0
+                change = K_FACTOR * (score - expected(first.rating, second.rating))
+                first.rating += change
+                second.rating -= change
+                first.battles += 1
+                second.battles += 1
+            if seq - last >= CHECKPOINT_EVERY:
+                checkpoints.append(RatingCheckpoint(league=league, seq=seq, ratings=json.dumps(
+                    {army_id: [rating.rating, rating.battles] for army_id, rating in ratings.items()})))
+                last = seq
+        ArmyRating.objects.bulk_update(list(stored.values()), ['rating', 'battles'])
+        ArmyRating.objects.bulk_create([rating for pk, rating in ratings.items() if pk not in stored])
+        RatingCheckpoint.objects.bulk_create(checkpoints)
+
+
+STANDINGS, STATS, RATINGS = StandingsProjection(), StatsProjection(), RatingsProjection()
+PROJECTIONS = (STANDINGS, STATS, RATINGS)
+
+
+def _locked_state(projection, league_id):
+    """ The projection's state of the league, locked until the surrounding transaction ends """
+    ProjectionState.objects.get_or_create(name=projection.name, league_id=league_id)
+    return ProjectionState.objects.select_for_update().get(name=projection.name, league_id=league_id)
+
+
+def catch_up(league_id, projections=PROJECTIONS, chunk_size=events.CHUNK_SIZE):
+    """
+    Apply the league's events each projection has not seen yet, one chunk per transaction. The state row is
+    locked while a chunk is applied so two workers never replay the same events. Soft-deleted leagues are left.
+    """
+    applied = False
+    for projection in projections:
+        while True:
+            if not League.objects.filter(pk=league_id).exists():
+                return
+            with transaction.atomic():
+                state = _locked_state(projection, league_id)
+                # Checked again under the lock, a league deleted meanwhile has already left the projections
+                league = League.objects.filter(pk=league_id).first()
+                if league is None:
+                    return
+                chunk = next(events.chunks(league_id, state.last_seq, chunk_size=chunk_size), None)
+                if chunk is None:
+                    break
+                projection.apply(league, chunk)
+                state.last_seq = chunk[-1].seq
+                state.save(update_fields=['last_seq'])
+                applied = True
+    if applied:
+        snapshots.bump(league_id)
+
+
+def schedule(league_id):
+    """
+    Queue catching the league's projections up for the worker. A job is queued on every change, as one already
+    waiting may be claimed before this change commits; copies claimed together run once.
+    """
+    jobs.enqueue('catch_up', league_id=league_id)
+
+
+@jobs.job('catch_up', merge=True)
+def catch_up_job(league_id):
+    catch_up(league_id)
+
+
+def remove_league(league_id):
+    """ Take a league being deleted out of the rollups, as far as the stats projection had applied its battles """
+    with transaction.atomic():
+        state = _locked_state(STATS, league_id)
+        rollups.apply(*rollups.battle_totals(events.battles(league_id, until_seq=state.last_seq)), sign=-1)
+
+
+def move_army(army, old_user_id, old_allegiance):
+    """ Move the record of the army's battles the stats projection has applied to its new player or allegiance """
+    with transaction.atomic():
+        state = _locked_state(STATS, army.league_id)
+        if not League.objects.filter(pk=army.league_id).exists():
+            return
+        battles = [row for row in events.battles(army.league_id, until_seq=state.last_seq) if army.id in row[1:3]]
+        rollups.move_army(army, old_user_id, old_allegiance, battles)
+
+
+def rebuild(projections=PROJECTIONS, chunk_size=events.CHUNK_SIZE):
+    """ Reset the projections and replay the whole log of every live league """
+    for projection in projections:
+        with transaction.atomic():
+            projection.reset()
+            ProjectionState.objects.filter(name=projection.name).delete()
+        for league_id in League.objects.values_list('pk', flat=True).order_by('pk').iterator():
+            catch_up(league_id, [projection], chunk_size)
+
+
+def schedule_reconcile(run_at=None):
+    """ Queue the next rollup reconciliation unless one is already waiting """
+    if not Job.objects.filter(name='reconcile_rollups', status=Job.Status.PENDING).exists():
+        jobs.enqueue('reconcile_rollups', run_at=run_at)
+
+
+@jobs.job('reconcile_rollups')
+def reconcile_rollups(chunk_size=events.CHUNK_SIZE):
+    """ Reconcile the rollups and queue the next run, a day on """
+    try:
+        STATS.reconcile(chunk_size)
+    finally:
+        schedule_reconcile(timezone.now() + RECONCILE_EVERY)
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import feed, jobs, projections, search
+from .models import League, Army, Battle, BattleEvent, DailyPoints, ProjectionState, ArmyRating, RatingCheckpoint
+
+CHUNK_SIZE = 1000
+FILE_BATCH_SIZE = 1000
+
+
+def soft_delete(league):
+    """ Hide the league straight away and queue removing its rows for the worker """
+    with transaction.atomic():
+        league.deleted_at = timezone.now()
+        league.save(update_fields=['deleted_at'])
+        projections.remove_league(league.id)
+        jobs.enqueue('purge_league', league_id=league.id)
+    feed.forget_users(Army.all_objects.filter(league=league).values_list('user_id', flat=True))
+
+
+@jobs.job('purge_league')
+def purge_league(league_id, chunk_size=CHUNK_SIZE):
+    """ Remove a soft-deleted league with bounded raw deletes, skipping the cascade collector and its signals """
+    league = League.all_objects.filter(pk=league_id, deleted_at__isnull=False).first()
+    if league is None:
+        return
+    _delete_in_chunks(DailyPoints.objects.filter(league_id=league_id), chunk_size)
+    _delete_in_chunks(ArmyRating.objects.filter(league_id=league_id), chunk_size)
+    _delete_in_chunks(RatingCheckpoint.objects.filter(league_id=league_id), chunk_size)
+    _delete_in_chunks(ProjectionState.objects.filter(league_id=league_id), chunk_size)
+    _delete_in_chunks(BattleEvent.objects.filter(league_id=league_id), chunk_size)
+    _delete_in_chunks(Battle.all_objects.filter(league_id=league_id), chunk_size)
+
+    # The collector would have nulled these, stray cross-league references must not block the raw delete
+    Battle.all_objects.filter(army1__league_id=league_id).update(army1=None)
+    Battle.all_objects.filter(army2__league_id=league_id).update(army2=None)
+    storage = Army._meta.get_field('image').storage
+    armies = Army.all_objects.filter(league_id=league_id)
+    while True:
+        with transaction.atomic():
+            chunk = list(armies.values_list('pk', 'image')[:chunk_size])
+            if not chunk:
+                break
+            Army.all_objects.filter(pk__in=[pk for pk, _ in chunk])._raw_delete(armies.db)
+        delete_files(storage, [image for _, image in chunk if image])
+
+    League.all_objects.filter(pk=league_id)._raw_delete(armies.db)
+    search.remove_league(league_id)
+    if league.image:
+        delete_files(league.image.storage, [league.image.name])
+
+
+def purge_deleted_leagues(chunk_size=CHUNK_SIZE):
+    for league_id in League.all_objects.filter(deleted_at__isnull=False).values_list('pk', flat=True):
+        purge_league(league_id, chunk_size)
+
+
+def _delete_in_chunks(queryset, chunk_size):
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return
+            queryset.model._base_manager.filter(pk__in=ids)._raw_delete(queryset.db)
+
+
+def delete_files(storage, names, batch_size=FILE_BATCH_SIZE):
+    """ Remove stored files, one request per batch on S3 rather than one per file """
+    names = list(names)
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is None:
+        for name in names:
+            storage.delete(name)
+        return
+    for start in range(0, len(names), batch_size):
+        bucket.delete_objects(Delete={
+            'Objects': [{'Key': storage._normalize_name(storage._clean_name(name))}
+                        for name in names[start:start + batch_size]],
+            'Quiet': True,
+        })
@@ -0,0 +1,115 @@
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Army, PlayerRollup, AllegianceRollup, Allegiance
+
+FIELDS = ('battles', 'wins', 'draws', 'losses', 'points')
+
+
+def _month(day):
+    return date(day.year, day.month, 1)
+
+
+def _record(own, other):
+    return Counter(battles=1, wins=int(own > other), draws=int(own == other), losses=int(own < other), points=own)
+
+
+def battle_totals(battles):
+    """ Player and allegiance-month records of (date, army1 id, army2 id, army1 pts, army2 pts) battle rows """
+    players, allegiances = defaultdict(Counter), defaultdict(Counter)
+    army_ids = {army_id for row in battles for army_id in row[1:3]} - {None}
+    armies = {pk: (user_id, allegiance) for pk, user_id, allegiance
+              in Army.all_objects.filter(pk__in=army_ids).values_list('pk', 'user_id', 'allegiance')}
+    for day, army1_id, army2_id, army1_pts, army2_pts in battles:
+        for army_id, own, other in ((army1_id, army1_pts, army2_pts), (army2_id, army2_pts, army1_pts)):
+            if army_id in armies:
+                user_id, allegiance = armies[army_id]
+                players[user_id].update(_record(own, other))
+                allegiances[(allegiance, _month(day))].update(_record(own, other))
+    return players, allegiances
+
+
+def _apply(model, lookup, record, sign):
+    changes = {field: sign * record[field] for field in FIELDS if record[field]}
+    if not changes:
+        return
+    if model.objects.filter(**lookup).update(**{field: F(field) + value for field, value in changes.items()}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **changes)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**{field: F(field) + value for field, value in changes.items()})
+
+
+def apply(players, allegiances, sign=1):
+    """ Add (sign 1) or remove (sign -1) records from the rollup tables """
+    for user_id, record in players.items():
+        _apply(PlayerRollup, {'user_id': user_id}, record, sign)
+    for (allegiance, month), record in allegiances.items():
+        _apply(AllegianceRollup, {'allegiance': allegiance, 'month': month}, record, sign)
+
+
+def move_army(army, old_user_id, old_allegiance, battles):
+    """ Move an army's record over the given battle rows to its new player or allegiance """
+    months = defaultdict(Counter)
+    for day, army1_id, army2_id, army1_pts, army2_pts in battles:
+        for army_id, own, other in ((army1_id, army1_pts, army2_pts), (army2_id, army2_pts, army1_pts)):
+            if army_id == army.id:
+                months[_month(day)].update(_record(own, other))
+    for month, record in months.items():
+        apply({old_user_id: record}, {(old_allegiance, month): record}, sign=-1)
+        apply({army.user_id: record}, {(army.allegiance, month): record})
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else 0
+
+
+def leaderboard(limit=50):
+    rows = PlayerRollup.objects.filter(battles__gt=0).select_related('user').order_by('-points', 'user')[:limit]
+    return [{
+        'rank': position,
+        'name': row.user.username,
+        'battles': row.battles,
+        'wins': row.wins,
+        'draws': row.draws,
+        'losses': row.losses,
+        'points': row.points,
+    } for position, row in enumerate(rows, 1)]
+
+
+def allegiance_meta():
+    """ All-time play and win rate of each allegiance """
+    rows = AllegianceRollup.objects.values('allegiance').order_by().annotate(battles=Sum('battles'), wins=Sum('wins'))
+    rows = [row for row in rows if row['battles']]
+    played = sum(row['battles'] for row in rows)
+    return [{
+        'allegiance': Allegiance(row['allegiance']).label,
+        'battles': row['battles'],
+        'play_rate': _rate(row['battles'], played),
+        'win_rate': _rate(row['wins'], row['battles']),
+    } for row in rows]
+
+
+def allegiance_history():
+    """ Per month play and win rate of each allegiance, keyed by allegiance code """
+    rows = list(AllegianceRollup.objects.filter(battles__gt=0).order_by('month', 'allegiance'))
+    played = Counter()
+    for row in rows:
+        played[row.month] += row.battles
+    history = defaultdict(list)
+    for row in rows:
+        history[row.allegiance].append({
+            'month': row.month.isoformat(),
+            'battles': row.battles,
+            'wins': row.wins,
+            'draws': row.draws,
+            'losses': row.losses,
+            'play_rate': _rate(row.battles, played[row.month]),
+            'win_rate': _rate(row.wins, row.battles),
+        })
+    return history
@@ -0,0 +1,197 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import League, Army, Allegiance
+
+LEAGUE, ARMY = 'league', 'army'
+KINDS = (LEAGUE, ARMY)
+TABLE = 'home_search'
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def _doc_id(kind, object_id):
+    """ Leagues and armies share the index, interleave their ids so each row keys on one integer """
+    return object_id * len(KINDS) + KINDS.index(kind)
+
+
+def _split_doc_id(doc_id):
+    return KINDS[doc_id % len(KINDS)], doc_id // len(KINDS)
+
+
+def terms(query):
+    return _TERM.findall(query.lower())[:8]
+
+
+class SearchBackend:
+    """ Full text index of league and army documents, rows are (kind, object id, league id, title, body) """
+
+    def create_schema(self, cursor):
+        raise NotImplementedError
+
+    def drop_schema(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS {}".format(TABLE))
+
+    def index(self, cursor, rows):
+        raise NotImplementedError
+
+    def remove(self, cursor, kind, object_id):
+        cursor.execute("DELETE FROM {} WHERE id = %s".format(TABLE), [_doc_id(kind, object_id)])
+
+    def remove_league(self, cursor, league_id):
+        cursor.execute("DELETE FROM {} WHERE league_id = %s".format(TABLE), [league_id])
+
+    def search(self, cursor, words, league_ids, kinds=KINDS, title_only=False, limit=20):
+        """ (kind, object id) of documents matching every word as a prefix, best first """
+        raise NotImplementedError
+
+
+class SqliteSearchBackend(SearchBackend):
+    """ FTS5 table whose rowid is the document id, league id and kind are stored but not tokenised """
+
+    def create_schema(self, cursor):
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5("
+                       "league_id UNINDEXED, title, body, prefix='2 3', tokenize='unicode61')".format(TABLE))
+
+    def index(self, cursor, rows):
+        rows = [(_doc_id(kind, object_id), league_id, title, body) for kind, object_id, league_id, title, body in rows]
+        cursor.executemany("DELETE FROM {} WHERE rowid = %s".format(TABLE), [row[:1] for row in rows])
+        cursor.executemany("INSERT INTO {}(rowid, league_id, title, body) VALUES (%s, %s, %s, %s)".format(TABLE), rows)
+
+    def remove(self, cursor, kind, object_id):
+        cursor.execute("DELETE FROM {} WHERE rowid = %s".format(TABLE), [_doc_id(kind, object_id)])
+
+    def search(self, cursor, words, league_ids, kinds=KINDS, title_only=False, limit=20):
+        if not words or not league_ids:
+            return []
+        match = ' '.join('"{}"*'.format(word) for word in words)
+        if title_only:
+            match = 'title : ({})'.format(match)
+        cursor.execute(
+            "SELECT rowid FROM {} WHERE {} MATCH %s AND league_id IN ({}) ORDER BY rank LIMIT %s".format(
+                TABLE, TABLE, ', '.join(['%s'] * len(league_ids))),
+            [match] + list(league_ids) + [limit * len(KINDS)])
+        found = [_split_doc_id(rowid) for rowid, in cursor.fetchall()]
+        return [(kind, object_id) for kind, object_id in found if kind in kinds][:limit]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """ Plain table with a weighted tsvector column behind a GIN index, titles weigh A and bodies B """
+    document = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+
+    def create_schema(self, cursor):
+        cursor.execute("CREATE TABLE IF NOT EXISTS {} (id bigint PRIMARY KEY, kind varchar(8) NOT NULL, "
+                       "league_id integer NOT NULL, document tsvector NOT NULL)".format(TABLE))
+        cursor.execute("CREATE INDEX IF NOT EXISTS {0}_document ON {0} USING GIN (document)".format(TABLE))
+        cursor.execute("CREATE INDEX IF NOT EXISTS {0}_league ON {0} (league_id)".format(TABLE))
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            "INSERT INTO {} (id, kind, league_id, document) VALUES (%s, %s, %s, {}) "
+            "ON CONFLICT (id) DO UPDATE SET league_id = EXCLUDED.league_id, document = EXCLUDED.document".format(
+                TABLE, self.document),
+            [(_doc_id(kind, object_id), kind, league_id, title, body)
+             for kind, object_id, league_id, title, body in rows])
+
+    def search(self, cursor, words, league_ids, kinds=KINDS, title_only=False, limit=20):
+        if not words or not league_ids:
+            return []
+        weight = 'A' if title_only else ''
+        tsquery = ' & '.join('{}:*{}'.format(word, weight) for word in words)
+        cursor.execute(
+            "SELECT id FROM {}, to_tsquery('simple', %s) query WHERE document @@ query "
+            "AND league_id = ANY(%s) AND kind = ANY(%s) ORDER BY ts_rank(document, query) DESC LIMIT %s".format(TABLE),
+            [tsquery, list(league_ids), list(kinds), limit])
+        return [_split_doc_id(doc_id) for doc_id, in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def backend_for(conn=connection):
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if conn.vendor not in BACKENDS:
+        raise ImproperlyConfigured("No search backend for the {} database".format(conn.vendor))
+    return BACKENDS[conn.vendor]()
+
+
+def league_row(league, owner_name):
+    return LEAGUE, league.id, league.id, league.title, '{} {}'.format(league.description, owner_name)
+
+
+def army_row(army, user_name):
+    return ARMY, army.id, army.league_id, army.title, '{} {}'.format(user_name, Allegiance(army.allegiance).label)
+
+
+def index_league(league):
+    with connection.cursor() as cursor:
+        backend_for().index(cursor, [league_row(league, league.owner.username)])
+
+
+def index_army(army):
+    with connection.cursor() as cursor:
+        backend_for().index(cursor, [army_row(army, army.user.username)])
+
+
+def remove(kind, object_id):
+    with connection.cursor() as cursor:
+        backend_for().remove(cursor, kind, object_id)
+
+
+def remove_league(league_id):
+    with connection.cursor() as cursor:
+        backend_for().remove_league(cursor, league_id)
+
+
+def rebuild(leagues, armies, chunk_size=1000):
+    """ Recreate the index from querysets of leagues and armies, one chunk of documents at a time """
+    backend = backend_for()
+    with connection.cursor() as cursor:
+        backend.drop_schema(cursor)
+        backend.create_schema(cursor)
+        chunk = []
+        for league in leagues.select_related('owner').iterator(chunk_size):
+            chunk.append(league_row(league, league.owner.username))
+            if len(chunk) >= chunk_size:
+                backend.index(cursor, chunk)
+                chunk = []
+        for army in armies.select_related('user').iterator(chunk_size):
+            chunk.append(army_row(army, army.user.username))
+            if len(chunk) >= chunk_size:
+                backend.index(cursor, chunk)
+                chunk = []
+        backend.index(cursor, chunk)
+
+
+def visible_leagues(user):
+    """ Leagues whose detail page the user may open: owned ones and any with one of their armies """
+    return League.objects.filter(Q(owner=user) | Q(army__user=user)).values_list('pk', flat=True).distinct()
+
+
+def search(user, query, limit=20):
+    """ Leagues and armies matching the query that the user is allowed to see """
+    with connection.cursor() as cursor:
+        found = backend_for().search(cursor, terms(query), list(visible_leagues(user)), limit=limit)
+    leagues = League.objects.select_related('owner').in_bulk([pk for kind, pk in found if kind == LEAGUE])
+    armies = Army.objects.select_related('user', 'league').in_bulk([pk for kind, pk in found if kind == ARMY])
+    return ([leagues[pk] for kind, pk in found if kind == LEAGUE and pk in leagues],
+            [armies[pk] for kind, pk in found if kind == ARMY and pk in armies])
+
+
+def opponents(league, user, query, limit=10):
+    """ Armies of the league, other than the user's own, whose title starts with the query words """
+    with connection.cursor() as cursor:
+        found = backend_for().search(cursor, terms(query), [league.id], kinds=(ARMY,), title_only=True,
+                                     limit=limit + 1)
+    armies = Army.objects.filter(pk__in=[pk for _, pk in found]).exclude(user=user).select_related('user')
+    return list(armies.order_by('title')[:limit])
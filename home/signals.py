@@ -0,0 +1,91 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import events, feed, projections, search, snapshots, tokens
+from .models import Army, Battle, BattleEvent, League
+
+
+def _day(battle):
+    return Battle._meta.get_field('date').to_python(battle.date)
+
+
+def _row(battle):
+    return _day(battle), battle.army1_id, battle.army2_id, battle.army1_pts, battle.army2_pts
+
+
+@receiver(pre_save, sender=Battle)
+def remember_battle(sender, instance, **kwargs):
+    """ Keep the stored row so the update event records what the edit replaced """
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Battle.all_objects.filter(pk=instance.pk) \
+            .values_list('date', 'army1_id', 'army2_id', 'army1_pts', 'army2_pts').first()
+
+
+@receiver(post_save, sender=Battle)
+def battle_saved(sender, instance, created, **kwargs):
+    kind = BattleEvent.Kind.CREATED if created else BattleEvent.Kind.UPDATED
+    previous = getattr(instance, '_previous', None)
+    events.record(instance.league_id, instance.pk, kind, previous, _row(instance), getattr(instance, '_actor', None))
+    projections.schedule(instance.league_id)
+    feed.forget_armies({instance.army1_id, instance.army2_id} | set(previous[1:3] if previous else ()))
+    snapshots.bump(instance.league_id)
+
+
+@receiver(post_delete, sender=Battle)
+def battle_deleted(sender, instance, **kwargs):
+    snapshots.bump(instance.league_id)
+    # Battles only cascade from their league, which is marked deleted before its rows go
+    if not League.objects.filter(pk=instance.league_id).exists():
+        return
+    events.record(instance.league_id, instance.pk, BattleEvent.Kind.DELETED, _row(instance), None,
+                  getattr(instance, '_actor', None))
+    projections.schedule(instance.league_id)
+    feed.forget_armies({instance.army1_id, instance.army2_id})
+
+
+@receiver(pre_save, sender=Army)
+def remember_army(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Army.all_objects.filter(pk=instance.pk).values_list('user_id', 'allegiance').first()
+
+
+@receiver(post_save, sender=Army)
+def army_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous and previous != (instance.user_id, instance.allegiance):
+        projections.move_army(instance, *previous)
+        feed.forget_users({previous[0], instance.user_id})
+    search.index_army(instance)
+    snapshots.bump(instance.league_id)
+
+
+@receiver(post_delete, sender=Army)
+def army_deleted(sender, instance, **kwargs):
+    search.remove(search.ARMY, instance.pk)
+    snapshots.bump(instance.league_id)
+
+
+@receiver(post_save, sender=League)
+def league_saved(sender, instance, **kwargs):
+    tokens.forget(instance)
+    search.index_league(instance)
+    snapshots.bump(instance.pk)
+
+
+@receiver(pre_delete, sender=League)
+def league_deleting(sender, instance, **kwargs):
+    """ Treat a hard delete like a soft one first, so the cascade below it leaves the rollups and log alone """
+    if League.all_objects.filter(pk=instance.pk, deleted_at__isnull=True).update(deleted_at=timezone.now()):
+        projections.remove_league(instance.pk)
+        feed.forget_users(Army.all_objects.filter(league=instance).values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=League)
+def league_deleted(sender, instance, **kwargs):
+    tokens.forget(instance)
+    search.remove(search.LEAGUE, instance.pk)
+    snapshots.bump(instance.pk)
+    BattleEvent.objects.filter(league_id=instance.pk).delete()
@@ -0,0 +1,215 @@
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import League, Army, Battle, Allegiance, INITIAL_RATING
+
+MAX_BYTES = 32 * 1024 * 1024
+MAX_AGE = 60
+
+
+class UserView:
+    __slots__ = ('id', 'username')
+
+    def __init__(self, id, username):
+        self.id, self.username = id, username
+
+
+class ArmyView:
+    """ Presentation copy of an army, allegiance holds its label """
+    __slots__ = ('id', 'title', 'allegiance', 'user', 'active', 'points', 'rating')
+
+    def __init__(self, id, title, allegiance, user, active, points, rating):
+        self.id, self.title, self.allegiance, self.user = id, title, allegiance, user
+        self.active, self.points, self.rating = active, points, rating
+
+    def __str__(self):
+        return self.title
+
+
+class BattleView:
+    __slots__ = ('id', 'date', 'army1', 'army2', 'army1_pts', 'army2_pts')
+
+    def __init__(self, id, date, army1, army2, army1_pts, army2_pts):
+        self.id, self.date, self.army1, self.army2, self.army1_pts, self.army2_pts = \
+            id, date, army1, army2, army1_pts, army2_pts
+
+
+class LeagueSnapshot:
+    """
+    Read-only copy of a league, its armies and its battles at one version. Armies and battles are held column-wise
+    in arrays and tuples instead of one model instance each, row objects are only made for what a page shows.
+    Battles run newest first, a missing army is stored as 0.
+    """
+    COLUMNS = ('army_ids', 'army_users', 'army_usernames', 'army_titles', 'army_allegiances', 'army_active',
+               'army_points', 'army_ratings',
+               'battle_ids', 'battle_days', 'battle_army1', 'battle_army2', 'battle_pts1', 'battle_pts2')
+    __slots__ = ('league', 'version', 'built', 'nbytes', '_positions') + COLUMNS
+
+    def __init__(self, league, version):
+        self.league = league
+        self.version = version
+        self.built = time.monotonic()
+
+    @classmethod
+    def build(cls, league_id, version):
+        """ Snapshot of a live league or None, reading each table once as value rows """
+        league = League.objects.select_related('owner').filter(pk=league_id).first()
+        if league is None:
+            return None
+        snapshot = cls(league, version)
+        armies = Army.objects.filter(league_id=league_id).order_by('pk') \
+            .values_list('pk', 'user_id', 'user__username', 'title', 'allegiance', 'active', 'rating__rating')
+        ids, users, active, ratings = array('l'), array('l'), array('b'), array('d')
+        usernames, titles, allegiances = [], [], []
+        for pk, user_id, username, title, allegiance, is_active, rating in armies:
+            ids.append(pk)
+            users.append(user_id)
+            usernames.append(username)
+            titles.append(title)
+            allegiances.append(allegiance)
+            active.append(is_active)
+            ratings.append(INITIAL_RATING if rating is None else rating)
+        positions = {pk: position for position, pk in enumerate(ids)}
+        points = array('l', bytes(ids.itemsize * len(ids)))
+
+        battles = Battle.objects.filter(league_id=league_id).order_by('-date', '-pk') \
+            .values_list('pk', 'date', 'army1_id', 'army2_id', 'army1_pts', 'army2_pts')
+        battle_ids, days, army1, army2, pts1, pts2 = (array('l') for _ in range(6))
+        for pk, day, army1_id, army2_id, army1_pts, army2_pts in battles.iterator():
+            battle_ids.append(pk)
+            days.append(day.toordinal())
+            army1.append(army1_id or 0)
+            army2.append(army2_id or 0)
+            pts1.append(army1_pts)
+            pts2.append(army2_pts)
+            if army1_id in positions:
+                points[positions[army1_id]] += army1_pts
+            if army2_id in positions:
+                points[positions[army2_id]] += army2_pts
+
+        snapshot._positions = positions
+        snapshot.army_ids, snapshot.army_users, snapshot.army_active = ids, users, active
+        snapshot.army_usernames, snapshot.army_titles = tuple(usernames), tuple(titles)
+        snapshot.army_allegiances, snapshot.army_points, snapshot.army_ratings = tuple(allegiances), points, ratings
+        snapshot.battle_ids, snapshot.battle_days, snapshot.battle_army1, snapshot.battle_army2 = \
+            battle_ids, days, army1, army2
+        snapshot.battle_pts1, snapshot.battle_pts2 = pts1, pts2
+        snapshot.nbytes = snapshot.size()
+        return snapshot
+
+    def size(self):
+        """ Approximate bytes held by the columns, what the process cache budgets by """
+        total = sys.getsizeof(self._positions)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            total += sys.getsizeof(column)
+            if isinstance(column, tuple):
+                total += sum(sys.getsizeof(value) for value in column)
+        return total
+
+    def player_ids(self, active_only=False):
+        return {user_id for user_id, active in zip(self.army_users, self.army_active) if active or not active_only}
+
+    def army(self, army_id):
+        position = self._positions.get(army_id)
+        if position is None:
+            return None
+        return ArmyView(army_id, self.army_titles[position], Allegiance(self.army_allegiances[position]).label,
+                        UserView(self.army_users[position], self.army_usernames[position]),
+                        bool(self.army_active[position]), self.army_points[position],
+                        self.army_ratings[position])
+
+    def standings(self):
+        """ Same rows as standings.standings_as_of() gives for today """
+        return [{
+            'name': self.army_usernames[position] if self.army_active[position] else 'RESIGNED',
+            'title': self.army_titles[position],
+            'allegiance': Allegiance(self.army_allegiances[position]).label,
+            'points': self.army_points[position],
+            'rating': round(self.army_ratings[position]),
+        } for position in range(len(self.army_ids))]
+
+    def battles(self, limit=None):
+        """ Battles newest first, sharing one army object per army """
+        count = len(self.battle_ids) if limit is None else min(limit, len(self.battle_ids))
+        armies = {army_id: self.army(army_id) for army_id in self.army_ids}
+        return [BattleView(self.battle_ids[i], date.fromordinal(self.battle_days[i]),
+                           armies.get(self.battle_army1[i]), armies.get(self.battle_army2[i]),
+                           self.battle_pts1[i], self.battle_pts2[i]) for i in range(count)]
+
+
+def current_version(league_id):
+    """ Version of a live league, None for a missing or deleted one """
+    return League.objects.filter(pk=league_id).values_list('version', flat=True).first()
+
+
+def bump(league_id):
+    """
+    Invalidate every process's snapshot of the league. The version is moved in the database as part of the write's
+    own transaction, so it becomes visible together with the change.
+    """
+    League.all_objects.filter(pk=league_id).update(version=F('version') + 1)
+
+
+class SnapshotCache:
+    """
+    Least recently used snapshots of this process, evicted once their estimated size passes max_bytes. Snapshots
+    older than max_age seconds are rebuilt whatever their version, in case a write ever slips past bump().
+    """
+
+    def __init__(self, max_bytes, max_age=MAX_AGE):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.total = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, league_id, version):
+        with self.lock:
+            snapshot = self.entries.get(league_id)
+            if snapshot is None or snapshot.version != version or time.monotonic() - snapshot.built > self.max_age:
+                return None
+            self.entries.move_to_end(league_id)
+            return snapshot
+
+    def put(self, snapshot):
+        with self.lock:
+            previous = self.entries.pop(snapshot.league.id, None)
+            if previous is not None:
+                self.total -= previous.nbytes
+            if snapshot.nbytes > self.max_bytes:
+                return
+            self.entries[snapshot.league.id] = snapshot
+            self.total += snapshot.nbytes
+            while self.total > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total -= evicted.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+
+snapshots = SnapshotCache(getattr(settings, 'SNAPSHOT_CACHE_BYTES', MAX_BYTES),
+                          getattr(settings, 'SNAPSHOT_MAX_AGE', MAX_AGE))
+
+
+def get(league_id):
+    """ Current snapshot of a live league, None when there is no such league """
+    version = current_version(league_id)
+    if version is None:
+        return None
+    snapshot = snapshots.get(league_id, version)
+    if snapshot is None:
+        snapshot = LeagueSnapshot.build(league_id, version)
+        if snapshot is not None:
+            snapshots.put(snapshot)
+    return snapshot
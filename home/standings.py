@@ -0,0 +1,77 @@
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Army, Battle, DailyPoints, Allegiance, INITIAL_RATING
+
+
+def repair(league_id, army_ids, since):
+    """ Rebuild the daily running totals of the given armies from ``since`` onward """
+    with transaction.atomic():
+        for army_id in Army.objects.filter(pk__in=set(army_ids) - {None}).values_list('pk', flat=True):
+            base = DailyPoints.objects.filter(army_id=army_id, date__lt=since) \
+                .order_by('-date').values_list('total', flat=True).first() or 0
+            DailyPoints.objects.filter(army_id=army_id, date__gte=since).delete()
+
+            per_day = defaultdict(int)
+            battles = Battle.objects.filter(league_id=league_id, date__gte=since)
+            for side in ('army1', 'army2'):
+                earned = battles.filter(**{side: army_id}).values('date').annotate(pts=Sum(side + '_pts'))
+                for row in earned:
+                    per_day[row['date']] += row['pts']
+
+            rows = []
+            for day in sorted(per_day):
+                base += per_day[day]
+                rows.append(DailyPoints(league_id=league_id, army_id=army_id, date=day,
+                                        points=per_day[day], total=base))
+            DailyPoints.objects.bulk_create(rows)
+
+
+def points_as_of(league_id, date=None):
+    """ Armies of the league annotated with their points total at the end of ``date`` """
+    latest = DailyPoints.objects.filter(army=OuterRef('pk'))
+    if date is not None:
+        latest = latest.filter(date__lte=date)
+    latest = latest.order_by('-date').values('total')[:1]
+    return Army.objects.filter(league_id=league_id).select_related('user') \
+        .annotate(points=Coalesce(Subquery(latest), 0),
+                  elo=Coalesce('rating__rating', Value(float(INITIAL_RATING))))
+
+
+def standings_as_of(league_id, date=None):
+    """ Standings table rows for the league as they stood at the end of ``date`` """
+    return [{
+        'name': army.user.username if army.active else 'RESIGNED',
+        'title': army.title,
+        'allegiance': Allegiance(army.allegiance).label,
+        'points': army.points,
+        'rating': round(army.elo),
+    } for army in points_as_of(league_id, date)]
+
+
+def rank(totals):
+    """ Competition ranking (1, 1, 3) of a mapping of army id to points """
+    ranks = {}
+    previous, position = None, 0
+    for index, (army_id, total) in enumerate(sorted(totals.items(), key=itemgetter(1), reverse=True), 1):
+        if total != previous:
+            previous, position = total, index
+        ranks[army_id] = position
+    return ranks
+
+
+def rank_history(league_id):
+    """ List of (date, {army id: rank}) for every day a battle was played, in one pass over the running totals """
+    rows = DailyPoints.objects.filter(league_id=league_id).order_by('date').values_list('date', 'army_id', 'total')
+    totals = {}
+    history = []
+    for day, group in groupby(rows.iterator(), key=itemgetter(0)):
+        for _, army_id, total in group:
+            totals[army_id] = total
+        history.append((day, rank(totals)))
+    return history
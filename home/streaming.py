@@ -0,0 +1,31 @@
+from uuid import uuid4
+
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+
+CHUNK_SIZE = 500
+
+
+def stream_table(request, template_name, context, table, chunk_size=CHUNK_SIZE):
+    """
+    Stream a page holding one big table. The page is rendered once with the table body left as a marker, so
+    everything up to the rows goes out before any row is rendered and the rows follow in chunks.
+    """
+    table.template_name = 'home/table_stream.html'
+    table.stream_marker = 'STREAM-ROWS-{}'.format(uuid4().hex)
+    head, tail = render_to_string(template_name, context, request).split(table.stream_marker, 1)
+
+    def content():
+        yield head
+        chunk, empty = [], True
+        for row in table.rows:
+            chunk.append(row)
+            empty = False
+            if len(chunk) >= chunk_size:
+                yield render_to_string('home/table_rows.html', {'rows': chunk})
+                chunk = []
+        if chunk or empty:
+            yield render_to_string('home/table_rows.html', {'rows': chunk, 'table': table})
+        yield tail
+
+    return StreamingHttpResponse(content(), content_type='text/html; charset=utf-8')
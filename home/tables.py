@@ -26,11 +26,20 @@ class BattleTable(tables.Table):
         }
 
 
+class FeedTable(BattleTable):
+    league = tables.Column(linkify=True)
+
+    class Meta(BattleTable.Meta):
+        sequence = ("league", "...")
+        exclude = ("Delete",)
+
+
 class StandingTable(tables.Table):
     name = tables.Column(orderable=False)
     title = tables.Column(orderable=False)
     allegiance = tables.Column(orderable=False)
     points = tables.Column(orderable=False)
+    rating = tables.Column(orderable=False)
 
     class Meta:
         order_by = '-points'
@@ -39,3 +48,50 @@ class StandingTable(tables.Table):
         attrs = {
             "class": "table table-bordered table-hover",
         }
+
+
+class PairingTable(tables.Table):
+    table = tables.Column(orderable=False)
+    army1 = tables.Column(orderable=False, verbose_name="Army")
+    army1_points = tables.Column(orderable=False, verbose_name="Points")
+    army2 = tables.Column(orderable=False, verbose_name="Opponent")
+    army2_points = tables.Column(orderable=False, verbose_name="Points")
+
+    class Meta:
+        template_name = "django_tables2/bootstrap4.html"
+
+        attrs = {
+            "class": "table table-bordered table-hover",
+        }
+
+
+class LeaderboardTable(tables.Table):
+    rank = tables.Column(orderable=False)
+    name = tables.Column(orderable=False)
+    battles = tables.Column(orderable=False)
+    wins = tables.Column(orderable=False)
+    draws = tables.Column(orderable=False)
+    losses = tables.Column(orderable=False)
+    points = tables.Column(orderable=False)
+
+    class Meta:
+        template_name = "django_tables2/bootstrap4.html"
+
+        attrs = {
+            "class": "table table-bordered table-hover",
+        }
+
+
+class AllegianceTable(tables.Table):
+    allegiance = tables.Column(orderable=False)
+    battles = tables.Column(orderable=False)
+    play_rate = tables.Column(orderable=False, verbose_name="Play Rate")
+    win_rate = tables.Column(orderable=False, verbose_name="Win Rate")
+
+    class Meta:
+        order_by = '-battles'
+        template_name = "django_tables2/bootstrap4.html"
+
+        attrs = {
+            "class": "table table-bordered table-hover",
+        }
@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import gzip
+import threading
+from collections import Counter
+from datetime import date
+from email.mime.text import MIMEText
+from importlib import import_module
+from itertools import combinations
+from uuid import uuid4
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core import mail as outbox
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail import EmailMessage, send_mail
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import checks, events, feed, jobs, pairings, profiling, projections, purge, rollups, search, snapshots, \
+    standings, tokens
+from .middleware import CompressionMiddleware
+from .models import League, Army, Battle, DailyPoints, PlayerRollup, AllegianceRollup, Job, BattleEvent, \
+    ProjectionState, ArmyRating, RatingCheckpoint, StaleBattle
+
+
+plain_static = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+
+
+def make_league(players=2, owner=None):
+    owner = owner or User.objects.create_user('owner')
+    league = League.objects.create(title='League', description='A league', image='league/l.png', owner=owner)
+    armies = [Army.objects.create(title='Army {}'.format(i), image='army/a.png', league=league,
+                                  user=User.objects.create_user('player{}-{}'.format(league.id, i)))
+              for i in range(players)]
+    return league, armies
+
+
+def battle(league, army1, army2, day, pts1, pts2):
+    """ Report a battle and let the projections catch up, as the worker would """
+    created = Battle.objects.create(league=league, army1=army1, army2=army2, date=day, army1_pts=pts1, army2_pts=pts2)
+    jobs.drain()
+    return created
+
+
+def points(league, day=None):
+    return {army.id: army.points for army in standings.points_as_of(league.id, day)}
+
+
+class StandingsTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b, self.c) = make_league(3)
+        battle(self.league, self.a, self.b, date(2020, 1, 1), 10, 5)
+        battle(self.league, self.b, self.c, date(2020, 1, 3), 8, 2)
+        battle(self.league, self.a, self.c, date(2020, 1, 5), 1, 9)
+
+    def test_points_as_of_date(self):
+        self.assertEqual(points(self.league, date(2019, 12, 31)), {self.a.id: 0, self.b.id: 0, self.c.id: 0})
+        self.assertEqual(points(self.league, date(2020, 1, 3)), {self.a.id: 10, self.b.id: 13, self.c.id: 2})
+        self.assertEqual(points(self.league), {army.id: army.get_points_for() for army in (self.a, self.b, self.c)})
+
+    def test_backdated_edit_repairs_suffix(self):
+        first = Battle.objects.get(date=date(2020, 1, 1))
+        first.date = date(2020, 1, 4)
+        first.army2 = self.c
+        first.save()
+        jobs.drain()
+        self.assertEqual(points(self.league, date(2020, 1, 3)), {self.a.id: 0, self.b.id: 8, self.c.id: 2})
+        self.assertEqual(points(self.league), {army.id: army.get_points_for() for army in (self.a, self.b, self.c)})
+        self.assertFalse(DailyPoints.objects.filter(army=self.a, date=date(2020, 1, 1)).exists())
+
+    def test_rank_history(self):
+        history = standings.rank_history(self.league.id)
+        self.assertEqual([day for day, _ in history], [date(2020, 1, 1), date(2020, 1, 3), date(2020, 1, 5)])
+        self.assertEqual(history[0][1], {self.a.id: 1, self.b.id: 2})
+        self.assertEqual(history[1][1], {self.a.id: 2, self.b.id: 1, self.c.id: 3})
+        self.assertEqual(history[2][1], {self.a.id: 2, self.b.id: 1, self.c.id: 2})
+
+    @plain_static
+    def test_history_view(self):
+        self.client.force_login(self.a.user)
+        response = self.client.get(reverse('league-history', args=[self.league.id]), {'date': '2020-01-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['points'] for row in response.context['standing_table'].data], [10, 13, 2])
+        self.assertEqual(response.context['chart']['labels'], ['2020-01-01', '2020-01-03', '2020-01-05'])
+
+
+class StandingsDeleteTests(TransactionTestCase):
+    def test_delete_repairs_totals(self):
+        league, (a, b) = make_league()
+        battle(league, a, b, date(2020, 1, 1), 3, 4)
+        second = battle(league, a, b, date(2020, 1, 2), 5, 6)
+        battle(league, a, b, date(2020, 1, 3), 7, 8)
+        second.delete()
+        jobs.drain()
+        self.assertEqual(points(league), {a.id: 10, b.id: 12})
+
+    def test_league_delete_cascades(self):
+        league, (a, b) = make_league()
+        battle(league, a, b, date(2020, 1, 1), 3, 4)
+        league.delete()
+        self.assertFalse(DailyPoints.objects.exists())
+
+
+class FakeBucket:
+    def __init__(self):
+        self.requests = []
+
+    def delete_objects(self, Delete):
+        self.requests.append([obj['Key'] for obj in Delete['Objects']])
+
+
+class FakeS3Storage:
+    def __init__(self):
+        self.bucket = FakeBucket()
+
+    def _clean_name(self, name):
+        return name
+
+    def _normalize_name(self, name):
+        return 'media/' + name
+
+
+class LeagueDeleteTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b) = make_league()
+        battle(self.league, self.a, self.b, date(2020, 1, 1), 3, 4)
+        battle(self.league, self.b, self.a, date(2020, 1, 2), 5, 6)
+
+    def test_delete_view_hides_league(self):
+        self.client.force_login(self.league.owner)
+        response = self.client.get(reverse('league-delete', args=[self.league.id]))
+        self.assertRedirects(response, reverse('league-index'), fetch_redirect_response=False)
+        self.assertFalse(League.objects.filter(pk=self.league.id).exists())
+        self.assertFalse(Army.objects.filter(league_id=self.league.id).exists())
+        self.assertFalse(Battle.objects.filter(league_id=self.league.id).exists())
+        self.assertEqual(Battle.all_objects.filter(league_id=self.league.id).count(), 2)
+        jobs.drain()
+        self.assertFalse(League.all_objects.filter(pk=self.league.id).exists())
+        self.assertFalse(Battle.all_objects.filter(league_id=self.league.id).exists())
+
+    def test_purge_removes_rows_in_chunks(self):
+        other, _ = make_league(owner=self.league.owner)
+        purge.soft_delete(self.league)
+        purge.purge_league(self.league.id, chunk_size=1)
+        self.assertFalse(League.all_objects.filter(pk=self.league.id).exists())
+        self.assertFalse(Army.all_objects.filter(league_id=self.league.id).exists())
+        self.assertFalse(Battle.all_objects.filter(league_id=self.league.id).exists())
+        self.assertFalse(DailyPoints.objects.filter(league_id=self.league.id).exists())
+        self.assertEqual(Army.objects.filter(league=other).count(), 2)
+
+    def test_purge_ignores_live_league(self):
+        purge.purge_league(self.league.id)
+        self.assertTrue(League.objects.filter(pk=self.league.id).exists())
+
+    def test_delete_files_batches_s3_requests(self):
+        storage = FakeS3Storage()
+        purge.delete_files(storage, ['army/{}.png'.format(i) for i in range(5)], batch_size=2)
+        self.assertEqual(storage.bucket.requests, [['media/army/0.png', 'media/army/1.png'],
+                                                   ['media/army/2.png', 'media/army/3.png'],
+                                                   ['media/army/4.png']])
+
+
+class JoinTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.league, _ = make_league()
+        self.user = User.objects.create_user('joiner')
+        self.client.force_login(self.user)
+
+    def test_malformed_token_skips_database(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(tokens.resolve('not-a-token'))
+
+    def test_hits_and_misses_are_cached(self):
+        missing = uuid4()
+        with self.assertNumQueries(2):
+            self.assertIsNone(tokens.resolve(missing))
+            self.assertIsNone(tokens.resolve(missing))
+            self.assertEqual(tokens.resolve(self.league.password), self.league)
+        with self.assertNumQueries(0):
+            self.assertIsNone(tokens.resolve(missing))
+            self.assertEqual(tokens.resolve(str(self.league.password)), self.league)
+
+    def test_league_delete_invalidates(self):
+        tokens.resolve(self.league.password)
+        purge.soft_delete(self.league)
+        self.assertIsNone(tokens.resolve(self.league.password))
+
+    def test_bucket_is_not_overdrawn_by_concurrent_attempts(self):
+        allowed = in_threads(tokens.BUCKET_CAPACITY * 3, lambda index: tokens.take('bucket-race'))
+        self.assertLessEqual(set(allowed), {True, False}, allowed)
+        self.assertLessEqual(sum(allowed), tokens.BUCKET_CAPACITY)
+        self.assertGreater(sum(allowed), 0)
+
+    @plain_static
+    def test_join_is_throttled(self):
+        url = reverse('league-join', args=['not-a-token'])
+        for _ in range(tokens.BUCKET_CAPACITY):
+            self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+
+@plain_static
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def add_league(self):
+        league, (a, b) = make_league(owner=User.objects.first())
+        battle(league, a, b, date(2020, 1, 1), 1, 2)
+        battle(league, b, a, date(2020, 1, 2), 3, 4)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, name):
+        url = reverse(name)
+        self.add_league()
+        few = self.queries(url)
+        for _ in range(5):
+            self.add_league()
+        self.assertEqual(self.queries(url), few)
+
+    def test_league_changelist(self):
+        self.assertConstantQueries('admin:home_league_changelist')
+
+    def test_army_changelist(self):
+        self.assertConstantQueries('admin:home_army_changelist')
+
+    def test_battle_changelist(self):
+        self.assertConstantQueries('admin:home_battle_changelist')
+
+
+class PairingTests(TestCase):
+    def test_swiss_avoids_rematch(self):
+        standings = [(1, 40), (2, 39), (3, 38), (4, 37)]
+        self.assertEqual(pairings.swiss(standings, Counter()), ([(1, 2), (3, 4)], None))
+        played = Counter({frozenset((1, 2)): 1})
+        self.assertEqual(pairings.swiss(standings, played), ([(1, 3), (2, 4)], None))
+
+    def test_swiss_finds_the_only_unplayed_partners_late_in_a_league(self):
+        standings = [(army_id, 100 - army_id) for army_id in range(1, 9)]
+        unplayed = {frozenset(pair) for pair in [(1, 8), (2, 7), (3, 6), (4, 5)]}
+        played = Counter({frozenset(pair): 1 for pair in combinations(range(1, 9), 2)
+                          if frozenset(pair) not in unplayed})
+        self.assertEqual(pairings.swiss(standings, played), ([(1, 8), (2, 7), (3, 6), (4, 5)], None))
+
+    def test_swiss_gives_last_army_the_bye(self):
+        pairs, bye = pairings.swiss([(1, 9), (2, 8), (3, 7)], Counter())
+        self.assertEqual((pairs, bye), ([(1, 2)], 3))
+
+    def test_swiss_moves_the_bye_up_to_an_army_that_has_not_sat_out(self):
+        # 3 sat out the last round, so it has played one battle fewer than the others
+        played = Counter({frozenset((1, 2)): 1, frozenset((4, 5)): 1})
+        pairs, bye = pairings.swiss([(1, 9), (2, 8), (3, 7), (4, 6), (5, 5)], played)
+        self.assertEqual(bye, 5)
+        played = Counter({frozenset((1, 2)): 1, frozenset((3, 4)): 1})
+        pairs, bye = pairings.swiss([(1, 9), (2, 8), (3, 7), (4, 6), (5, 5)], played)
+        self.assertEqual(bye, 4)
+        self.assertEqual(sorted(army_id for pair in pairs for army_id in pair), [1, 2, 3, 5])
+
+    def test_swiss_from_league(self):
+        league, armies = make_league(4)
+        battle(league, armies[0], armies[1], date(2020, 1, 1), 20, 19)
+        battle(league, armies[2], armies[3], date(2020, 1, 1), 2, 1)
+        pairs, bye = pairings.swiss(pairings.live_standings(league.id), pairings.head_to_head(league.id))
+        self.assertEqual(pairs, [(armies[0].id, armies[2].id), (armies[1].id, armies[3].id)])
+
+    def test_round_robin_meets_everyone_once(self):
+        rounds = pairings.round_robin(range(7))
+        self.assertEqual(len(rounds), 7)
+        met = Counter(frozenset(pair) for pairs, _ in rounds for pair in pairs)
+        self.assertEqual(set(met), {frozenset(pair) for pair in combinations(range(7), 2)})
+        self.assertEqual(set(met.values()), {1})
+        self.assertEqual(sorted(bye for _, bye in rounds), list(range(7)))
+
+    @plain_static
+    def test_pairings_view_is_owner_only(self):
+        league, armies = make_league(3)
+        self.client.force_login(armies[0].user)
+        self.assertEqual(self.client.get(reverse('league-pairings', args=[league.id])).status_code, 403)
+        self.client.force_login(league.owner)
+        response = self.client.get(reverse('league-pairings', args=[league.id]), {'mode': 'round-robin'})
+        self.assertEqual(len(response.context['rounds']), 3)
+
+
+def brute_force_rollups():
+    players, allegiances = Counter(), Counter()
+    for match in Battle.objects.select_related('army1', 'army2'):
+        for army, own, other in ((match.army1, match.army1_pts, match.army2_pts),
+                                 (match.army2, match.army2_pts, match.army1_pts)):
+            if army is None:
+                continue
+            record = {'battles': 1, 'wins': int(own > other), 'draws': int(own == other),
+                      'losses': int(own < other), 'points': own}
+            for field, value in record.items():
+                players[(army.user_id, field)] += value
+                allegiances[(army.allegiance, date(match.date.year, match.date.month, 1), field)] += value
+    return +players, +allegiances
+
+
+def stored_rollups():
+    players, allegiances = Counter(), Counter()
+    for row in PlayerRollup.objects.all():
+        for field in rollups.FIELDS:
+            players[(row.user_id, field)] = getattr(row, field)
+    for row in AllegianceRollup.objects.all():
+        for field in rollups.FIELDS:
+            allegiances[(row.allegiance, row.month, field)] = getattr(row, field)
+    return +players, +allegiances
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b, self.c) = make_league(3)
+        self.other, (self.d, self.e) = make_league(2, owner=self.league.owner)
+        self.c.allegiance = 'SKN'
+        self.c.save()
+        battle(self.league, self.a, self.b, date(2020, 1, 1), 10, 5)
+        battle(self.league, self.b, self.c, date(2020, 1, 20), 8, 8)
+        battle(self.league, self.a, self.c, date(2020, 2, 5), 1, 9)
+        battle(self.other, self.d, self.e, date(2020, 2, 6), 4, 3)
+
+    def test_incremental_matches_brute_force(self):
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+        moved = Battle.objects.get(date=date(2020, 1, 1))
+        moved.date, moved.army2, moved.army1_pts = date(2020, 3, 1), self.c, 2
+        moved.save()
+        Battle.objects.get(date=date(2020, 1, 20)).delete()
+        jobs.drain()
+        self.b.allegiance = 'NUR'
+        self.b.save()
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+
+    def test_league_delete_drops_its_battles(self):
+        purge.soft_delete(self.league)
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+        self.assertEqual(PlayerRollup.objects.get(user=self.d.user).wins, 1)
+
+    def test_reconcile_matches_brute_force(self):
+        PlayerRollup.objects.update(points=0)
+        AllegianceRollup.objects.all().delete()
+        PlayerRollup.objects.create(user=self.league.owner, battles=3)
+        projections.STATS.reconcile(chunk_size=2)
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+
+    def test_reconcile_keeps_changes_applied_meanwhile(self):
+        PlayerRollup.objects.filter(user=self.a.user).update(points=0)
+        original = rollups.apply
+
+        def apply_with_concurrent_write(players, allegiances, sign=1):
+            # A battle of a league outside the first group lands between its scan and its write back
+            rollups.apply = original
+            battle(self.other, self.d, self.e, date(2020, 3, 1), 6, 1)
+            original(players, allegiances, sign)
+        rollups.apply = apply_with_concurrent_write
+        try:
+            projections.STATS.reconcile(group_size=1)
+        finally:
+            rollups.apply = original
+        players, _ = stored_rollups()
+        self.assertEqual(players[(self.a.user_id, 'points')], 11)
+        self.assertEqual(players[(self.d.user_id, 'points')], 10)
+
+    def test_reconcile_reschedules_itself(self):
+        jobs.enqueue('reconcile_rollups')
+        self.assertEqual(jobs.drain(), 1)
+        queued = Job.objects.get(name='reconcile_rollups')
+        self.assertGreater(queued.run_at, timezone.now())
+        projections.schedule_reconcile()
+        self.assertEqual(Job.objects.filter(name='reconcile_rollups').count(), 1)
+
+    @plain_static
+    def test_stats_views_read_rollups(self):
+        self.client.force_login(self.a.user)
+        response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse('stats-api')).json()
+        self.assertEqual(data['leaderboard'][0]['name'], self.c.user.username)
+        skaven = next(row for row in data['allegiances'] if row['allegiance'] == 'SKN')
+        self.assertEqual(skaven['months'], [
+            {'month': '2020-01-01', 'battles': 1, 'wins': 0, 'draws': 1, 'losses': 0, 'play_rate': 0.25, 'win_rate': 0},
+            {'month': '2020-02-01', 'battles': 1, 'wins': 1, 'draws': 0, 'losses': 0, 'play_rate': 0.25, 'win_rate': 1.0},
+        ])
+
+
+def ratings(league):
+    return {army_id: round(rating, 6) for army_id, rating
+            in ArmyRating.objects.filter(league=league).values_list('army_id', 'rating')}
+
+
+def daily_points(league):
+    return set(DailyPoints.objects.filter(league=league).values_list('army_id', 'date', 'points', 'total'))
+
+
+class EventLogTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b, self.c) = make_league(3)
+        self.first = battle(self.league, self.a, self.b, date(2020, 1, 1), 10, 5)
+        self.second = battle(self.league, self.b, self.c, date(2020, 1, 3), 8, 8)
+
+    def test_writes_append_numbered_events(self):
+        second_id = self.second.id
+        self.first.army1_pts = 2
+        self.first.save()
+        self.second.delete()
+        log = list(BattleEvent.objects.filter(league=self.league).order_by('seq'))
+        self.assertEqual([(event.seq, event.battle_id, event.kind) for event in log], [
+            (1, self.first.id, 'created'), (2, second_id, 'created'),
+            (3, self.first.id, 'updated'), (4, second_id, 'deleted')])
+        self.assertEqual(events.rows(log[2]), ((date(2020, 1, 1), self.a.id, self.b.id, 10, 5),
+                                               (date(2020, 1, 1), self.a.id, self.b.id, 2, 5)))
+        self.assertEqual(events.rows(log[3]), ((date(2020, 1, 3), self.b.id, self.c.id, 8, 8), None))
+        with self.assertRaises(ValueError):
+            log[0].save()
+
+    def test_ratings_follow_results(self):
+        rated = ratings(self.league)
+        self.assertGreater(rated[self.a.id], 1000)
+        self.assertAlmostEqual(sum(rated.values()), 3000)
+        self.first.delete()
+        jobs.drain()
+        self.assertEqual(ratings(self.league), {self.b.id: 1000, self.c.id: 1000})
+
+    def test_catch_up_replays_only_newer_events(self):
+        ProjectionState.objects.filter(league=self.league, name='stats').update(last_seq=1)
+        PlayerRollup.objects.filter(user=self.c.user).delete()
+        projections.catch_up(self.league.id)
+        self.assertEqual(PlayerRollup.objects.get(user=self.c.user).draws, 1)
+        self.assertEqual(PlayerRollup.objects.get(user=self.a.user).battles, 1)
+
+    def test_rebuild_matches_incremental(self):
+        self.first.date, self.first.army2 = date(2020, 1, 5), self.c
+        self.first.save()
+        battle(self.league, self.c, self.a, date(2020, 1, 4), 1, 7)
+        self.second.delete()
+        jobs.drain()
+        expected = stored_rollups(), daily_points(self.league), ratings(self.league)
+        call_command('rebuild_projections', chunk_size=2)
+        self.assertEqual((stored_rollups(), daily_points(self.league), ratings(self.league)), expected)
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+
+    def test_projections_catch_up_in_the_worker(self):
+        battle_count = PlayerRollup.objects.get(user=self.a.user).battles
+        Battle.objects.create(league=self.league, army1=self.a, army2=self.c, date=date(2020, 1, 6),
+                              army1_pts=3, army2_pts=1)
+        self.first.army1_pts = 4
+        self.first.save()
+        self.assertEqual(PlayerRollup.objects.get(user=self.a.user).battles, battle_count)
+        self.assertEqual(Job.objects.filter(name='catch_up').count(), 2)
+        self.c.allegiance = 'NUR'
+        self.c.save()
+        jobs.drain()
+        self.assertEqual(PlayerRollup.objects.get(user=self.a.user).battles, battle_count + 1)
+        self.assertEqual(stored_rollups(), brute_force_rollups())
+
+    def test_edit_replays_ratings_from_a_checkpoint(self):
+        checkpoint_every = projections.CHECKPOINT_EVERY
+        projections.CHECKPOINT_EVERY = 2
+        try:
+            later = [battle(self.league, (self.a, self.b, self.c)[i % 3], (self.b, self.c, self.a)[i % 3],
+                            date(2020, 1, 10 + i), i, 3) for i in range(6)]
+            self.assertEqual(list(RatingCheckpoint.objects.values_list('seq', flat=True).order_by('seq')),
+                             [3, 5, 7])
+            later[3].army1_pts = 9
+            later[3].save()
+            replayed = []
+            standing = events.standing
+
+            def recording(league_id, after_seq=0, until_seq=None, chunk_size=events.CHUNK_SIZE):
+                replayed.append(after_seq)
+                return standing(league_id, after_seq, until_seq, chunk_size)
+            events.standing = recording
+            try:
+                jobs.drain()
+            finally:
+                events.standing = standing
+            # The edited battle was reported at seq 6, so the checkpoint at 5 still holds
+            self.assertEqual(replayed, [5])
+            expected = ratings(self.league)
+            call_command('rebuild_projections', only=['ratings'])
+            self.assertEqual(ratings(self.league), expected)
+        finally:
+            projections.CHECKPOINT_EVERY = checkpoint_every
+
+    @plain_static
+    def test_delete_and_its_event_commit_together(self):
+        self.client.force_login(self.league.owner)
+        record = events.record
+
+        def failing(*args, **kwargs):
+            raise DatabaseError("log unavailable")
+        events.record = failing
+        try:
+            with self.assertRaises(DatabaseError):
+                self.client.get(reverse('battle-delete', args=[self.first.id]))
+        finally:
+            events.record = record
+        self.assertTrue(Battle.objects.filter(pk=self.first.pk).exists())
+
+    def test_purge_removes_log(self):
+        purge.soft_delete(self.league)
+        purge.purge_league(self.league.id)
+        self.assertFalse(BattleEvent.objects.filter(league_id=self.league.id).exists())
+        self.assertFalse(ProjectionState.objects.exists())
+
+    @plain_static
+    def test_views_record_actor(self):
+        self.client.force_login(self.league.owner)
+        self.client.get(reverse('battle-delete', args=[self.first.id]))
+        self.assertEqual(BattleEvent.objects.get(kind='deleted').actor, self.league.owner)
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.league, (self.a, self.b) = make_league()
+        self.other, (self.c, self.d) = make_league(owner=self.league.owner)
+        self.c.user = self.a.user
+        self.c.save()
+        self.mine = [battle(self.league, self.a, self.b, date(2020, 1, day), day, 0) for day in (1, 2, 2)] + \
+            [battle(self.other, self.d, self.c, date(2020, 1, day), 0, day) for day in (2, 3)]
+        battle(self.league, self.b, self.b, date(2020, 1, 4), 1, 1)
+
+    def test_keyset_pages_across_leagues(self):
+        expected = sorted(self.mine, key=lambda match: (match.date, match.pk), reverse=True)
+        seen, after = [], None
+        while True:
+            rows, next_cursor = feed.page(self.a.user, after, size=2)
+            seen.extend(rows)
+            if next_cursor is None:
+                break
+            after = feed.parse_cursor(next_cursor)
+        self.assertEqual(seen, expected)
+        self.assertIsNone(feed.parse_cursor('2020-13-01.5'))
+
+    def test_first_page_cached_until_write(self):
+        feed.page(self.a.user)
+        with self.assertNumQueries(0):
+            rows, _ = feed.page(self.a.user)
+        self.assertEqual(len(rows), 5)
+        battle(self.other, self.c, self.d, date(2020, 1, 9), 1, 0)
+        rows, _ = feed.page(self.a.user)
+        self.assertEqual(rows[0].date, date(2020, 1, 9))
+
+    def test_each_side_walks_its_own_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows, _ = feed.page(self.a.user, size=2)
+        side_queries = [query['sql'] for query in queries.captured_queries if 'LIMIT 3' in query['sql']]
+        self.assertEqual(len(side_queries), 4)
+        for sql in side_queries:
+            self.assertNotIn('home_league', sql)
+            self.assertRegex(sql, r'"army[12]_id" = \d+')
+        self.assertEqual([match.date for match in rows], [date(2020, 1, 3), date(2020, 1, 2)])
+
+    @plain_static
+    def test_view_renders_league_column(self):
+        self.client.force_login(self.a.user)
+        feed.page(self.a.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('battle-feed'))
+        self.assertContains(response, self.other.get_absolute_url())
+        self.assertNotContains(response, 'deleteBattleModal')
+        self.assertContains(response, reverse('battle-update', args=[self.mine[0].id]))
+        self.assertEqual(len(response.context['battle_table'].rows), 5)
+
+
+def in_threads(count, func):
+    """ Run func(index) in count threads released together, each with its own connection, and return the results """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(index):
+        try:
+            barrier.wait()
+            results[index] = func(index)
+        except Exception as exc:
+            results[index] = exc
+        finally:
+            connections.close_all()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@plain_static
+class BattleWriteTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b) = make_league()
+        self.client.force_login(self.a.user)
+
+    def submit(self, key):
+        return self.client.post(reverse('battle-create', args=[self.league.id]), {
+            'date': '2020-01-01', 'army1_pts': 3, 'army2': self.b.id, 'army2_pts': 1, 'idempotency_key': key})
+
+    def test_resubmitted_form_saves_once(self):
+        key = uuid4()
+        for _ in range(2):
+            response = self.submit(key)
+            self.assertRedirects(response, self.league.get_absolute_url(), fetch_redirect_response=False)
+        self.submit(uuid4())
+        self.assertEqual(Battle.objects.count(), 2)
+        self.assertEqual(Job.objects.filter(name='notify_opponent').count(), 2)
+
+    def test_other_integrity_errors_are_not_taken_for_a_resubmission(self):
+        battle(self.league, self.a, self.b, date(2020, 1, 1), 1, 1)
+        self.assertEqual(self.submit('').status_code, 200)
+        record = events.record
+
+        def clashing(*args, **kwargs):
+            raise IntegrityError("UNIQUE constraint failed: home_battleevent.league_id, home_battleevent.seq")
+        events.record = clashing
+        try:
+            with self.assertRaises(IntegrityError):
+                self.submit(uuid4())
+        finally:
+            events.record = record
+        self.assertEqual(Battle.objects.count(), 1)
+
+    def test_stale_edit_is_rejected(self):
+        match = battle(self.league, self.a, self.b, date(2020, 1, 1), 3, 1)
+        url = reverse('battle-update', args=[match.id])
+        form = {'date': '2020-01-01', 'army1_pts': 5, 'army2': self.b.id, 'army2_pts': 1, 'version': match.version}
+        self.assertEqual(self.client.post(url, form).status_code, 302)
+        response = self.client.post(url, dict(form, army1_pts=9))
+        self.assertContains(response, 'reload the page')
+        match.refresh_from_db()
+        self.assertEqual((match.army1_pts, match.version), (5, 1))
+        Battle.objects.filter(pk=match.pk).update(version=2)
+        with self.assertRaises(StaleBattle):
+            match.save()
+        with self.assertRaises(StaleBattle):
+            match.save(update_fields=['army1_pts'])
+        self.assertEqual(match.version, 1)
+
+    def test_partial_save_still_moves_the_version(self):
+        match = battle(self.league, self.a, self.b, date(2020, 1, 1), 3, 1)
+        match.army1_pts = 4
+        match.save(update_fields=['army1_pts'])
+        match.refresh_from_db()
+        self.assertEqual((match.army1_pts, match.version), (4, 1))
+
+
+class FeedCommitTests(TransactionTestCase):
+    def test_page_cached_before_the_write_commits_is_dropped(self):
+        cache.clear()
+        league, (a, b) = make_league()
+        with transaction.atomic():
+            battle(league, a, b, date(2020, 1, 1), 1, 0)
+            # Another request reads the feed before the battle is committed
+            cache.set(feed._key(a.user_id), ([], None), feed.TIMEOUT)
+        self.assertEqual(len(feed.page(a.user)[0]), 1)
+
+
+class BattleConcurrencyTests(TransactionTestCase):
+    """ Threads racing on a real database, the outcome must not depend on how they interleave """
+    threads = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("An in-memory SQLite database locks whole tables instead of letting writers wait")
+        self.league, (self.a, self.b) = make_league()
+
+    def assertOneWinner(self, results, loss):
+        """ Exactly one thread returned True and every other one lost with the expected exception """
+        self.assertEqual(results.count(True), 1, results)
+        for result in results:
+            if result is not True:
+                self.assertIsInstance(result, loss)
+
+    def test_duplicate_submissions_race(self):
+        key = uuid4()
+
+        def create(index):
+            with transaction.atomic():
+                Battle.objects.create(league=self.league, army1=self.a, army2=self.b, army1_pts=index,
+                                      army2_pts=0, date=date(2020, 1, 1), idempotency_key=key)
+            return True
+        self.assertOneWinner(in_threads(self.threads, create), IntegrityError)
+        self.assertEqual(Battle.objects.filter(idempotency_key=key).count(), 1)
+        self.assertEqual(BattleEvent.objects.filter(league=self.league).count(), 1)
+
+    def test_concurrent_edits_race(self):
+        match = battle(self.league, self.a, self.b, date(2020, 1, 1), 0, 0)
+        copies = [Battle.objects.get(pk=match.pk) for _ in range(self.threads)]
+
+        def edit(index):
+            copies[index].army1_pts = index + 1
+            copies[index].save()
+            return True
+        self.assertOneWinner(in_threads(self.threads, edit), StaleBattle)
+        jobs.drain()
+        match.refresh_from_db()
+        self.assertEqual(match.version, 1)
+        self.assertEqual(points(self.league)[self.a.id], match.army1_pts)
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        snapshots.snapshots.clear()
+        self.league, (self.a, self.b, self.c) = make_league(3)
+        battle(self.league, self.a, self.b, date(2020, 1, 1), 10, 5)
+        battle(self.league, self.b, self.c, date(2020, 1, 3), 8, 2)
+        self.c.active = False
+        self.c.save()
+
+    def test_matches_database(self):
+        snapshot = snapshots.get(self.league.id)
+        self.assertEqual(snapshot.standings(), standings.standings_as_of(self.league.id))
+        newest = snapshot.battles(limit=1)[0]
+        self.assertEqual((newest.date, newest.army1.title, newest.army2.user.username, newest.army1_pts),
+                         (date(2020, 1, 3), self.b.title, self.c.user.username, 8))
+        self.assertEqual(snapshot.player_ids(active_only=True), {self.a.user_id, self.b.user_id})
+
+    def test_writes_invalidate(self):
+        first = snapshots.get(self.league.id)
+        self.assertIs(snapshots.get(self.league.id), first)
+        battle(self.league, self.c, self.a, date(2020, 1, 4), 1, 1)
+        second = snapshots.get(self.league.id)
+        self.assertGreater(second.version, first.version)
+        self.assertEqual(len(second.battle_ids), 3)
+        purge.soft_delete(self.league)
+        self.assertIsNone(snapshots.get(self.league.id))
+
+    def test_version_is_shared_through_the_database(self):
+        first = snapshots.get(self.league.id)
+        stale = League.objects.get(pk=self.league.pk)
+        # Another process reports a battle, nothing in this process's memory is touched
+        Battle.all_objects.filter(pk=Battle.objects.first().pk).update(army1_pts=20)
+        League.objects.filter(pk=self.league.pk).update(version=F('version') + 1)
+        second = snapshots.get(self.league.id)
+        self.assertIsNot(second, first)
+        stale.title = 'Renamed'
+        stale.save()
+        self.assertGreater(snapshots.current_version(self.league.id), second.version)
+
+    def test_old_snapshots_are_rebuilt(self):
+        cache = snapshots.SnapshotCache(max_bytes=snapshots.MAX_BYTES, max_age=60)
+        snapshot = snapshots.get(self.league.id)
+        cache.put(snapshot)
+        self.assertIs(cache.get(self.league.id, snapshot.version), snapshot)
+        snapshot.built -= 61
+        self.assertIsNone(cache.get(self.league.id, snapshot.version))
+
+    def test_cache_evicts_least_recently_used(self):
+        one = snapshots.get(self.league.id)
+        two = snapshots.get(make_league(owner=self.league.owner)[0].id)
+        three = snapshots.get(make_league(owner=self.league.owner)[0].id)
+        cache = snapshots.SnapshotCache(max_bytes=one.nbytes + two.nbytes + three.nbytes - 1)
+        cache.put(one)
+        cache.put(two)
+        self.assertIs(cache.get(one.league.id, one.version), one)
+        self.assertIsNone(cache.get(one.league.id, one.version + 1))
+        cache.put(three)
+        self.assertIsNone(cache.get(two.league.id, two.version))
+        self.assertIs(cache.get(one.league.id, one.version), one)
+        self.assertEqual(cache.total, one.nbytes + three.nbytes)
+
+    @plain_static
+    def test_pages_read_snapshot(self):
+        self.client.force_login(self.a.user)
+        response = self.client.get(reverse('league-detail', args=[self.league.id]))
+        self.assertContains(response, 'Beasts of Chaos')
+        self.assertContains(response, 'RESIGNED')
+        # Session, user and the league's version, the rest comes from the snapshot
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('league-api', args=[self.league.id])).json()
+        self.assertEqual([row['id'] for row in data['battles']],
+                         sorted(Battle.objects.filter(league=self.league).values_list('pk', flat=True), reverse=True))
+        self.assertEqual(self.client.get(reverse('league-api', args=[self.league.id + 100])).status_code, 404)
+        self.client.force_login(self.c.user)
+        self.assertEqual(self.client.get(reverse('battle-index', args=[self.league.id])).status_code, 403)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.league, (self.a, self.b) = make_league()
+        self.league.title = 'Grand Tourney of Ghur'
+        self.league.save()
+        self.a.title = 'Hammers of Sigmar'
+        self.a.save()
+        self.b.title = 'Hosts of Slaanesh'
+        self.b.save()
+        self.hidden, (self.c,) = make_league(1, owner=User.objects.create_user('stranger'))
+        self.hidden.title = 'Hidden Tourney'
+        self.hidden.save()
+
+    def test_results_follow_membership(self):
+        leagues, armies = search.search(self.a.user, 'tourney')
+        self.assertEqual(leagues, [self.league])
+        leagues, armies = search.search(self.c.user, 'tourney')
+        self.assertEqual(leagues, [self.hidden])
+
+    def test_prefix_matches_titles_and_players(self):
+        self.assertEqual(search.search(self.a.user, 'ham sig')[1], [self.a])
+        self.assertEqual(search.search(self.a.user, self.b.user.username)[1], [self.b])
+        self.assertEqual(search.search(self.a.user, 'nothing')[1], [])
+
+    def test_migration_fills_the_index(self):
+        migration = import_module('home.migrations.0014_search_index')
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {}".format(search.TABLE))
+        self.assertEqual(search.search(self.a.user, 'ham sig')[1], [])
+        migration.create_search_index(apps, connection.schema_editor())
+        self.assertEqual(search.search(self.a.user, 'ham sig')[1], [self.a])
+        self.assertEqual(search.search(self.c.user, 'hidden')[0], [self.hidden])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.b.title = 'Legion of Azgorh'
+        self.b.save()
+        self.assertEqual(search.search(self.a.user, 'hosts')[1], [])
+        self.assertEqual(search.search(self.a.user, 'azg')[1], [self.b])
+        purge.soft_delete(self.league)
+        self.assertEqual(search.search(self.a.user, 'azg'), ([], []))
+
+    def test_opponent_autocomplete(self):
+        self.client.force_login(self.a.user)
+        url = reverse('battle-opponents', args=[self.league.id])
+        self.assertEqual(self.client.get(url, {'q': 'ho'}).json()['results'][0]['id'], self.b.id)
+        self.assertEqual(self.client.get(url, {'q': 'ham'}).json()['results'], [])
+        self.client.force_login(self.c.user)
+        self.assertEqual(self.client.get(url, {'q': 'ho'}).status_code, 403)
+
+    @plain_static
+    def test_battle_create_switches_to_autocomplete(self):
+        self.client.force_login(self.a.user)
+        response = self.client.get(reverse('battle-create', args=[self.league.id]))
+        self.assertFalse(response.context['autocomplete'])
+        for i in range(51):
+            Army.objects.create(title='Extra {}'.format(i), image='army/a.png', league=self.league,
+                                user=User.objects.create_user('extra{}'.format(i)))
+        response = self.client.get(reverse('battle-create', args=[self.league.id]))
+        self.assertTrue(response.context['autocomplete'])
+        self.assertNotContains(response, 'Extra 1<')
+
+
+calls = []
+
+
+@jobs.job('test_flaky')
+def flaky(fail_times):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError("flaky")
+
+
+@jobs.job('test_merged', merge=True)
+def merged(key):
+    calls.append(key)
+
+
+queued_mail = override_settings(EMAIL_BACKEND='home.mail.QueuedEmailBackend',
+                                QUEUED_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+
+
+class JobTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_merge_runs_copies_claimed_together_once(self):
+        for key in ('a', 'b', 'a', 'a'):
+            jobs.enqueue('test_merged', key=key)
+        self.assertEqual(jobs.drain(), 4)
+        self.assertEqual(sorted(calls), ['a', 'b'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retries_with_backoff(self):
+        queued = jobs.enqueue('test_flaky', max_attempts=3, fail_times=1)
+        self.assertEqual(jobs.drain(), 1)
+        job = Job.objects.get(pk=queued.pk)
+        self.assertEqual((job.status, job.attempts), (Job.Status.PENDING, 1))
+        self.assertIn('RuntimeError: flaky', job.last_error)
+        Job.objects.filter(pk=job.pk).update(run_at=job.created)
+        self.assertEqual(jobs.drain(), 1)
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_gives_up_after_max_attempts(self):
+        queued = jobs.enqueue('test_flaky', max_attempts=1, fail_times=5)
+        jobs.drain()
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.Status.FAILED)
+
+    def test_lapsed_lease_is_reclaimed(self):
+        queued = jobs.enqueue('test_flaky', fail_times=0)
+        self.assertEqual(len(jobs.claim()), 1)
+        self.assertEqual(jobs.claim(), [])
+        Job.objects.filter(pk=queued.pk).update(run_at=queued.created)
+        self.assertEqual(jobs.drain(), 1)
+        self.assertEqual(calls, [0])
+
+    def test_lapsed_lease_on_last_attempt_fails(self):
+        queued = jobs.enqueue('test_flaky', max_attempts=2, fail_times=0)
+        Job.objects.filter(pk=queued.pk).update(status=Job.Status.RUNNING, attempts=2, run_at=queued.created)
+        self.assertEqual(jobs.drain(), 0)
+        job = Job.objects.get(pk=queued.pk)
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(calls, [])
+
+    @queued_mail
+    def test_mime_attachments_are_sent_straight_away(self):
+        message = EmailMessage('Report', 'Attached', 'site@example.com', ['a@example.com'])
+        message.attach(MIMEText('inline part'))
+        message.send()
+        self.assertEqual(len(outbox.outbox), 1)
+        self.assertFalse(Job.objects.filter(name='send_email').exists())
+
+    @queued_mail
+    def test_fail_silently_is_honoured(self):
+        def broken():
+            message = EmailMessage('Broken', 'Body', 'site@example.com', ['a@example.com'])
+            message.attachments.append(('broken.txt', object(), 'text/plain'))
+            return message
+        self.assertEqual(broken().send(fail_silently=True), 0)
+        with self.assertRaises(AttributeError):
+            broken().send()
+
+    @queued_mail
+    def test_mail_is_queued_then_sent_in_batch(self):
+        send_mail('Welcome', 'Hello', 'site@example.com', ['a@example.com'])
+        send_mail('Welcome', 'Hello', 'site@example.com', ['b@example.com'])
+        self.assertEqual(len(outbox.outbox), 0)
+        self.assertEqual(Job.objects.filter(name='send_email').count(), 2)
+        self.assertEqual(jobs.drain(), 2)
+        self.assertEqual(sorted(message.to[0] for message in outbox.outbox), ['a@example.com', 'b@example.com'])
+
+    @queued_mail
+    @plain_static
+    def test_battle_create_notifies_opponent(self):
+        league, (a, b) = make_league()
+        b.user.email = 'enemy@example.com'
+        b.user.save()
+        self.client.force_login(a.user)
+        response = self.client.post(reverse('battle-create', args=[league.id]), {
+            'date': '2020-01-01', 'army1_pts': 10, 'army2': b.id, 'army2_pts': 3, 'idempotency_key': uuid4()})
+        self.assertEqual(response.status_code, 302)
+        jobs.drain()
+        self.assertEqual(outbox.outbox[0].to, ['enemy@example.com'])
+        self.assertIn('Army 0: 10 points', outbox.outbox[0].body)
+
+
+class CompressionTests(TestCase):
+    body = b'<tr><td>Battle</td></tr>' * 200
+
+    def respond(self, view, **headers):
+        request = RequestFactory().get('/', **headers)
+        return CompressionMiddleware(lambda request: view(request))(request)
+
+    def test_gzip_dynamic_response(self):
+        response = self.respond(lambda request: HttpResponse(self.body), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_csrf_pages_stay_uncompressed(self):
+        def view(request):
+            get_token(request)
+            return HttpResponse(self.body)
+        response = self.respond(view, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+
+    def test_streamed_gzip(self):
+        response = self.respond(lambda request: StreamingHttpResponse(iter([self.body[:100], self.body[100:]])),
+                                HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    def test_identity_when_not_accepted(self):
+        response = self.respond(lambda request: HttpResponse(self.body))
+        self.assertEqual(response.content, self.body)
+
+    @plain_static
+    def test_battles_page_streams_rows(self):
+        league, (a, b) = make_league()
+        for day in range(1, 4):
+            battle(league, a, b, date(2020, 1, day), day, 0)
+        self.client.force_login(a.user)
+        response = self.client.get(reverse('battle-index', args=[league.id]))
+        self.assertTrue(response.streaming)
+        page = b''.join(response.streaming_content).decode()
+        self.assertEqual(page.count('data-battle-id='), 3)
+        self.assertLess(page.index('<thead'), page.index('data-battle-id='))
+        self.assertLess(page.rindex('data-battle-id='), page.index('</tbody>'))
+        self.assertIn('deleteBattleModal', page[page.index('</tbody>'):])
+
+
+@plain_static
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.league, (self.army, _) = make_league()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def profile(self, token):
+        url = reverse('league-detail', args=[self.league.id])
+        return self.client.get(url, {profiling.QUERY_FLAG: token})
+
+    def test_signed_flag_records_profile(self):
+        self.profile(profiling.make_token(self.staff))
+        record, = profiling.recent()
+        self.assertEqual(record['user'], 'staff')
+        self.assertTrue(record['queries'])
+        response = self.client.get(reverse('profile-detail', args=[record['id']]))
+        self.assertContains(response, '<details')
+        folded = self.client.get(reverse('profile-flamegraph', args=[record['id']]))
+        for line in folded.content.decode().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_flag_ignored_without_valid_staff_token(self):
+        self.profile('forged')
+        self.client.force_login(self.army.user)
+        self.profile(profiling.make_token(self.army.user))
+        self.assertEqual(profiling.recent(), [])
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 302)
+
+    @override_settings(PROFILING_BUFFER_SIZE=3)
+    def test_ring_buffer_keeps_latest(self):
+        for number in range(5):
+            profiling.store({'number': number})
+        self.assertEqual([record['number'] for record in profiling.recent()], [4, 3, 2])
+        self.assertIsNone(profiling.get(1))
+
+    def test_outline_nests_stacks(self):
+        tree = profiling.call_tree([(('a', 'b'), 3), (('a', 'c'), 1), (('d',), 1)])
+        rows = profiling.outline(tree)
+        self.assertEqual([(row['name'], row['depth'], row['count']) for row in rows],
+                         [('all', 0, 5), ('a', 1, 4), ('b', 2, 3), ('c', 2, 1), ('d', 1, 1)])
+        self.assertEqual([len(row['closing']) for row in rows], [0, 0, 1, 2, 2])
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_process_local_cache_is_reported(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([error.id for error in checks.check_shared_cache(None)], ['home.W001'])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+                                                   'LOCATION': ['127.0.0.1:11211']}}):
+            self.assertEqual(checks.check_shared_cache(None), [])
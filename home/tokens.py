@@ -0,0 +1,77 @@
+import time
+from uuid import UUID
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import League
+
+POSITIVE_TIMEOUT = 60 * 60
+NEGATIVE_TIMEOUT = 10 * 60
+MISS = 0
+
+BUCKET_CAPACITY = 10
+BUCKET_RATE = 1 / 6
+LOCK_TIMEOUT = 5
+
+
+def _key(token):
+    return 'league-token:{}'.format(token.hex)
+
+
+def resolve(token):
+    """
+    League for a join token or None, malformed tokens never reach the database and misses are cached too.
+    Saving or deleting a league drops its entry from the shared cache, so a deleted one is not returned.
+    """
+    try:
+        token = UUID(str(token))
+    except ValueError:
+        return None
+    league = cache.get(_key(token))
+    if league is None:
+        league = League.objects.filter(password=token).first()
+        cache.set(_key(token), MISS if league is None else league,
+                  NEGATIVE_TIMEOUT if league is None else POSITIVE_TIMEOUT)
+    return None if league == MISS else league
+
+
+def forget(league):
+    cache.delete(_key(league.password))
+
+
+def client_ip(request):
+    header = getattr(settings, 'CLIENT_IP_HEADER', None)
+    if header and request.META.get(header):
+        # The proxy appends the address it saw, anything before it came from the client
+        return request.META[header].split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take(key, capacity=BUCKET_CAPACITY, rate=BUCKET_RATE):
+    """
+    Take one token from the bucket stored under key, False once it has run dry. The bucket is read and written
+    under a lock in the cache, an attempt arriving while another one holds it is refused rather than waiting.
+    """
+    lock = '{}:lock'.format(key)
+    if not cache.add(lock, True, LOCK_TIMEOUT):
+        return False
+    try:
+        now = time.time()
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), int(capacity / rate) + 1)
+        return allowed
+    finally:
+        cache.delete(lock)
+
+
+def allow_attempt(request):
+    """ Throttle join attempts per client address and per user """
+    keys = ['join-throttle:ip:{}'.format(client_ip(request))]
+    if request.user.is_authenticated:
+        keys.append('join-throttle:user:{}'.format(request.user.pk))
+    return all([take(key) for key in keys])
@@ -14,8 +14,19 @@ urlpatterns = [
     path('army/update/<int:pk>', views.ArmyUpdate.as_view(), name='army-update'),
     path('leave/<int:league_id>', views.leave, name='league-leave'),
     path('<int:league_id>/create', views.BattleCreate.as_view(), name='battle-create'),
+    path('<int:league_id>/opponents', views.opponents, name='battle-opponents'),
     path('<int:league_id>/battles', views.battles, name='battle-index'),
+    path('<int:league_id>/history', views.history, name='league-history'),
+    path('<int:league_id>/pairings', views.pairing, name='league-pairings'),
+    path('battles', views.my_battles, name='battle-feed'),
     path('battles/delete/<int:battle_id>', views.battle_delete, name='battle-delete'),
     path('battles/update/<int:pk>', views.BattleUpdate.as_view(), name='battle-update'),
+    path('search', views.search_results, name='search'),
+    path('stats', views.stats, name='stats'),
+    path('api/stats', views.stats_api, name='stats-api'),
+    path('api/leagues/<int:league_id>', views.league_api, name='league-api'),
+    path('profiles', views.profiles, name='profiles'),
+    path('profiles/<int:number>', views.profile_detail, name='profile-detail'),
+    path('profiles/<int:number>/folded', views.profile_flamegraph, name='profile-flamegraph'),
     path('faq', views.faq, name='faq'),
 ]
\ No newline at end of file
@@ -1,19 +1,27 @@
+from uuid import uuid4
+
+from django import forms
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied, ObjectDoesNotExist, ValidationError
+from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse, Http404
 from django.urls import reverse_lazy
+from django.utils.dateparse import parse_date
 from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, UpdateView, DeleteView, ListView
 from django_tables2 import SingleTableView
 from sitegate.signin_flows.modern import ModernSignin
 from sitegate.signup_flows.classic import ClassicWithEmailSignup
 
-from .models import League, Battle, Army, Allegiance
-from .tables import BattleTable, StandingTable
+from . import feed, jobs, pairings, profiling, purge, rollups, search, snapshots, standings, tokens
+from .models import League, Battle, Army, Allegiance, StaleBattle
+from .streaming import stream_table
+from .tables import BattleTable, FeedTable, StandingTable, PairingTable, LeaderboardTable, AllegianceTable
 from sitegate.decorators import signup_view, signin_view
 
 
@@ -79,32 +87,105 @@ def delete(request, league_id):
     league = get_object_or_404(League, id=league_id)
     if not league.owner == request.user:
         raise PermissionDenied
-    league.delete()
+    purge.soft_delete(league)
     return redirect('league-index')
 
 
+def _snapshot(request, league_id, active_only=False):
+    """ Snapshot of a league the user owns or plays in """
+    snapshot = snapshots.get(league_id)
+    if snapshot is None:
+        raise Http404("No league {}".format(league_id))
+    if not snapshot.league.owner_id == request.user.id \
+            and request.user.id not in snapshot.player_ids(active_only=active_only):
+        raise PermissionDenied
+    return snapshot
+
+
 @login_required
 def detail(request, league_id):
+    snapshot = _snapshot(request, league_id)
+    context = {'league': snapshot.league,
+               'battle_table': BattleTable(snapshot.battles(limit=10)),
+               'standing_table': StandingTable(snapshot.standings())}
+    return render(request, 'home/league_detail.html', context)
+
+
+@login_required
+def league_api(request, league_id):
+    snapshot = _snapshot(request, league_id)
+
+    def army(view):
+        return view and {'id': view.id, 'title': view.title, 'player': view.user.username}
+    return JsonResponse({
+        'id': snapshot.league.id,
+        'title': snapshot.league.title,
+        'owner': snapshot.league.owner.username,
+        'version': snapshot.version,
+        'standings': snapshot.standings(),
+        'battles': [{
+            'id': battle.id,
+            'date': battle.date.isoformat(),
+            'army1': army(battle.army1),
+            'army2': army(battle.army2),
+            'army1_pts': battle.army1_pts,
+            'army2_pts': battle.army2_pts,
+        } for battle in snapshot.battles(limit=50)],
+    })
+
+
+@login_required
+def history(request, league_id):
     league = get_object_or_404(League, pk=league_id)
-    players = [army.user.id for army in Army.objects.filter(league_id=league_id)]
-    if league.owner == request.user or request.user.id in players:
-        standings = []
-        for army in Army.objects.filter(league_id=league_id):
-            standings.append({
-                'name': army.user.username if army.active else 'RESIGNED',
-                'title': army.title,
-                'allegiance': Allegiance(army.allegiance).label,
-                'points': army.get_points_for(),
-            })
-        standing_table = StandingTable(standings)
-        last_battles = Battle.objects.filter(league_id=league_id).order_by('-date')[:10]
-        battle_table = BattleTable(list(last_battles))
-        context = {'league': league,
-                   'battle_table': battle_table,
-                   'standing_table': standing_table}
-        return render(request, 'home/league_detail.html', context)
-    else:
+    players = [army.user_id for army in Army.objects.filter(league_id=league_id)]
+    if not league.owner == request.user and not request.user.id in players:
+        raise PermissionDenied
+    try:
+        as_of = parse_date(request.GET.get('date') or '')
+    except ValueError:
+        as_of = None
+    armies = Army.objects.filter(league_id=league_id).order_by('id')
+    rank_history = standings.rank_history(league_id)
+    chart = {
+        'labels': [day.isoformat() for day, _ in rank_history],
+        'datasets': [{
+            'label': army.title,
+            'data': [ranks.get(army.id) for _, ranks in rank_history],
+        } for army in armies],
+    }
+    context = {'league': league,
+               'as_of': as_of,
+               'standing_table': StandingTable(standings.standings_as_of(league_id, as_of), exclude=('rating',)),
+               'chart': chart}
+    return render(request, 'home/league_history.html', context)
+
+
+@login_required
+def pairing(request, league_id):
+    league = get_object_or_404(League, pk=league_id)
+    if not league.owner == request.user:
         raise PermissionDenied
+    live = pairings.live_standings(league_id)
+    armies = {army.id: army for army in Army.objects.filter(league_id=league_id).select_related('user')}
+    points = dict(live)
+
+    def table(pairs):
+        return PairingTable([{
+            'table': number,
+            'army1': '{} ({})'.format(armies[army1].title, armies[army1].user.username),
+            'army1_points': points[army1],
+            'army2': '{} ({})'.format(armies[army2].title, armies[army2].user.username),
+            'army2_points': points[army2],
+        } for number, (army1, army2) in enumerate(pairs, 1)])
+
+    if request.GET.get('mode') == 'round-robin':
+        rounds = pairings.round_robin(army_id for army_id, _ in live)
+    else:
+        rounds = [pairings.swiss(live, pairings.head_to_head(league_id))]
+    context = {'league': league,
+               'round_robin': request.GET.get('mode') == 'round-robin',
+               'rounds': [(table(pairs), armies[bye] if bye else None) for pairs, bye in rounds]}
+    return render(request, 'home/league_pairings.html', context)
 
 
 @method_decorator(login_required, name='dispatch')
@@ -116,9 +197,10 @@ class ArmyCreate(CreateView):
               'image']
 
     def dispatch(self, request, *args, **kwargs):
-        try:
-            self.league = League.objects.get(password=self.kwargs['token'])
-        except (ValidationError, ObjectDoesNotExist):
+        if not tokens.allow_attempt(request):
+            return HttpResponse("Too many attempts to join a league, try again later.", status=429)
+        self.league = tokens.resolve(self.kwargs['token'])
+        if self.league is None:
             messages.error(request, "No league found for that token.", extra_tags='join-league')
             return redirect('league-index')
         try:
@@ -169,15 +251,45 @@ def leave(request, league_id):
 
 @login_required
 def battles(request, league_id):
-    league = get_object_or_404(League, pk=league_id)
-    players = set([army.user.id for army in Army.objects.filter(league=league) if army.active])
-    if not league.owner == request.user and not request.user.id in players:
-        raise PermissionDenied
-    battle_table = BattleTable(Battle.objects.filter(league=league).order_by('-date'))
+    snapshot = _snapshot(request, league_id, active_only=True)
+    battle_table = BattleTable(snapshot.battles())
     context = {
         'battle_table': battle_table
     }
-    return render(request, 'home/battles.html', context)
+    return stream_table(request, 'home/battles.html', context, battle_table)
+
+
+@login_required
+def my_battles(request):
+    rows, next_cursor = feed.page(request.user, feed.parse_cursor(request.GET.get('after')))
+    context = {'battle_table': FeedTable(rows),
+               'next_cursor': next_cursor,
+               'first_page': 'after' not in request.GET}
+    return render(request, 'home/my_battles.html', context)
+
+
+@login_required
+def search_results(request):
+    query = request.GET.get('q', '')
+    leagues, armies = search.search(request.user, query)
+    context = {'query': query,
+               'leagues': leagues,
+               'armies': armies}
+    return render(request, 'home/search.html', context)
+
+
+@login_required
+def opponents(request, league_id):
+    league = get_object_or_404(League, pk=league_id)
+    if not Army.objects.filter(league=league, user=request.user).exists():
+        raise PermissionDenied
+    return JsonResponse({'results': [{
+        'id': army.id,
+        'text': '{} ({})'.format(army.title, army.user.username),
+    } for army in search.opponents(league, request.user, request.GET.get('q', ''))]})
+
+
+OPPONENT_SELECT_LIMIT = 50
 
 
 @method_decorator(login_required, name='dispatch')
@@ -196,16 +308,35 @@ class BattleCreate(CreateView):
     def get_form(self, form_class=None):
         form = super(BattleCreate, self).get_form(form_class)
         form.fields['army2'].queryset = Army.objects.filter(Q(league=self.league) & ~Q(user=self.request.user))
+        self.autocomplete = form.fields['army2'].queryset.count() > OPPONENT_SELECT_LIMIT
+        if self.autocomplete:
+            # Large leagues pick the opponent through search instead of rendering every army as an option
+            form.fields['army2'].widget = forms.HiddenInput()
+        form.fields['idempotency_key'] = forms.UUIDField(initial=uuid4, widget=forms.HiddenInput())
         return form
 
     def get_context_data(self, **kwargs):
         kwargs['league'] = self.league
-        return super().get_context_data(**kwargs)
+        context = super().get_context_data(**kwargs)
+        context['autocomplete'] = self.autocomplete
+        return context
 
     def form_valid(self, form):
         form.instance.army1 = Army.objects.get(Q(league=self.league) & Q(user=self.request.user))
         form.instance.league = self.league
-        return super().form_valid(form)
+        form.instance._actor = self.request.user
+        form.instance.idempotency_key = form.cleaned_data['idempotency_key']
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+        except IntegrityError:
+            # The unique key turns a resubmitted form into a no-op, the first submission already saved the battle
+            key = form.instance.idempotency_key
+            if key is None or not Battle.all_objects.filter(idempotency_key=key).exists():
+                raise
+            return redirect('league-detail', self.league.id)
+        jobs.enqueue('notify_opponent', battle_id=self.object.id)
+        return response
 
 
 @login_required
@@ -216,7 +347,9 @@ def battle_delete(request, battle_id):
             and not battle.army2.user == request.user \
             and not league.owner == request.user:
         raise PermissionDenied
-    battle.delete()
+    battle._actor = request.user
+    with transaction.atomic():
+        battle.delete()
     return redirect('battle-index', league.id)
 
 
@@ -227,7 +360,8 @@ class BattleUpdate(UpdateView):
     fields = ['date',
               'army1_pts',
               'army2',
-              'army2_pts']
+              'army2_pts',
+              'version']
 
     def dispatch(self, request, *args, **kwargs):
         battle = get_object_or_404(Battle, id=self.kwargs['pk'])
@@ -237,8 +371,67 @@ class BattleUpdate(UpdateView):
     def get_form(self, form_class=None):
         form = super(BattleUpdate, self).get_form(form_class)
         form.fields['army2'].queryset = Army.objects.filter(Q(league=self.league) & ~Q(user=self.request.user))
+        form.fields['version'].widget = forms.HiddenInput()
         return form
 
+    def form_valid(self, form):
+        form.instance._actor = self.request.user
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except StaleBattle:
+            form.add_error(None, "Someone else changed this battle while you were editing it, "
+                                 "reload the page to see their changes.")
+            return self.form_invalid(form)
+
+
+@login_required
+def stats(request):
+    context = {'leaderboard_table': LeaderboardTable(rollups.leaderboard()),
+               'allegiance_table': AllegianceTable(rollups.allegiance_meta())}
+    return render(request, 'home/stats.html', context)
+
+
+@login_required
+def stats_api(request):
+    return JsonResponse({
+        'leaderboard': rollups.leaderboard(),
+        'allegiances': [{
+            'allegiance': code,
+            'label': Allegiance(code).label,
+            'months': months,
+        } for code, months in sorted(rollups.allegiance_history().items())],
+    })
+
+
+@staff_member_required
+def profiles(request):
+    context = {'profiles': profiling.recent(), 'token': profiling.make_token(request.user),
+               'flag': profiling.QUERY_FLAG}
+    return render(request, 'home/profiles.html', context)
+
+
+def _profile(number):
+    record = profiling.get(number)
+    if record is None:
+        raise Http404("Profile {} is no longer kept".format(number))
+    return record
+
+
+@staff_member_required
+def profile_detail(request, number):
+    record = _profile(number)
+    context = {'profile': record, 'tree': profiling.outline(profiling.call_tree(record['samples'])),
+               'query_time': round(sum(duration for _, duration in record['queries']), 1)}
+    return render(request, 'home/profile_detail.html', context)
+
+
+@staff_member_required
+def profile_flamegraph(request, number):
+    response = HttpResponse(profiling.folded(_profile(number)['samples']), content_type='text/plain')
+    response['Content-Disposition'] = 'attachment; filename="profile-{}.folded"'.format(number)
+    return response
+
 
 def faq(request):
     return render(request, 'home/faq.html')